@@ -1,5 +1,7 @@
-from iebank_api import app
-from flask import Flask
+from iebank_api import create_app, start_background_tasks
+
+app = create_app()
 
 if __name__ == "__main__":
+    start_background_tasks(app)
     app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,123 @@
+"""
+Compare the ORM serialization of transaction lists with the column-tuple path.
+
+Seeds `--transactions` rows, then for `--rows` transactions at a time
+measures:
+
+- legacy: `Transaction` ORM objects, a dict per row built with `strftime`
+  and `.transaction_type.value`, encoded with `json.dumps`
+- fast: `TRANSACTION_COLUMNS` tuples, `serialize_transactions` and
+  `iebank_api.encoding.dumps` (orjson when installed)
+
+Each stage (fetch, serialize, encode) reports the best of `--repeat` runs.
+
+    python benchmarks/serialization.py --rows 200
+    python benchmarks/serialization.py --rows 50000 --transactions 100000
+
+The target database is treated as scratch space: its tables are dropped and
+recreated.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from iebank_api import db
+from iebank_api.encoding import dumps
+from iebank_api.history import _TRANSACTION_SELECT, serialize_transactions
+from iebank_api.models import Transaction
+from iebank_api.seeding import seed_database
+
+
+def legacy_serialize(transactions):
+    return [
+        {
+            "id": transaction.id,
+            "created_at": transaction.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            "transaction_type": transaction.transaction_type.value,
+            "account_id": transaction.account_id,
+            "sent_account_id": transaction.sent_account_id,
+            "amount": transaction.amount,
+            "currency": transaction.currency,
+            "description": transaction.description,
+            "fx_rate": transaction.fx_rate,
+            "converted_amount": transaction.converted_amount,
+        }
+        for transaction in transactions
+    ]
+
+
+def best_of(repeat, stage):
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = stage()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def measure(Session, rows, repeat, fetch, serialize, encode):
+    def fetch_stage():
+        with Session() as session:
+            return fetch(session, rows)
+
+    fetch_seconds, fetched = best_of(repeat, fetch_stage)
+    serialize_seconds, records = best_of(repeat, lambda: serialize(fetched))
+    encode_seconds, _ = best_of(repeat, lambda: encode({"transactions": records}))
+    total = fetch_seconds + serialize_seconds + encode_seconds
+    return {
+        "fetch_ms": round(fetch_seconds * 1000, 2),
+        "serialize_ms": round(serialize_seconds * 1000, 2),
+        "encode_ms": round(encode_seconds * 1000, 2),
+        "total_ms": round(total * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--transactions", type=int, default=50000)
+    parser.add_argument("--rows", type=int, default=200, help="transactions per listing")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "serialization.db")
+    engine = create_engine(database_url)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    seed_database(engine, 100, "hash", transactions=args.transactions, rng=random.Random(1))
+    Session = sessionmaker(engine)
+
+    order = (Transaction.created_at.desc(), Transaction.id.desc())
+    legacy = measure(
+        Session, args.rows, args.repeat,
+        lambda session, rows: session.scalars(select(Transaction).order_by(*order).limit(rows)).all(),
+        legacy_serialize,
+        json.dumps,
+    )
+    fast = measure(
+        Session, args.rows, args.repeat,
+        lambda session, rows: session.execute(select(*_TRANSACTION_SELECT).order_by(*order).limit(rows)).all(),
+        serialize_transactions,
+        dumps,
+    )
+
+    print(json.dumps({
+        "dialect": engine.dialect.name,
+        "rows": args.rows,
+        "legacy": legacy,
+        "fast": fast,
+        "speedup": round(legacy["total_ms"] / fast["total_ms"], 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measure application cold start: interpreter start to first served request.
+
+Each run starts a fresh interpreter that imports `iebank_api`, calls
+`create_app()` and serves `GET /` through the test client, recording the
+time spent in each phase. Reports the median of `--runs` runs as JSON.
+
+    python benchmarks/startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import iebank_api
+imported = time.perf_counter()
+app = iebank_api.create_app()
+created = time.perf_counter()
+response = app.test_client().get("/")
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "total_ms": (served - started) * 1000,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ, ENV=os.getenv("ENV", "local"))
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(json.dumps({
+        "runs": args.runs,
+        **{key: round(statistics.median(sample[key] for sample in samples), 1) for key in samples[0]},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 from dotenv import load_dotenv
 import os
 import urllib.parse
-from azure.identity import DefaultAzureCredential
 
 load_dotenv()
 
@@ -10,44 +9,91 @@ class Config(object):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     APPINSIGHTS_CONNECTION_STRING = os.getenv('APPINSIGHTS_CONNECTION_STRING')
     APPINSIGHTS_INSTRUMENTATIONKEY = os.getenv('APPINSIGHTS_INSTRUMENTATIONKEY')
+    # Per-process cache of logged-in user identities (entries, seconds)
+    USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 10000))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 60))
+    # Password hashing: Werkzeug method string (cost included) and worker pool
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 4))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    # Structured JSON logging: levels per logger and sampling of chatty loggers
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+    LOG_SAMPLING = os.getenv('LOG_SAMPLING', 'iebank_api.profiling=0.1')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    # Prometheus metrics at /metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    # Per-request SQL profiling (Server-Timing header, N+1 warnings)
+    SQL_PROFILER_ENABLED = os.getenv('SQL_PROFILER_ENABLED', 'true').lower() == 'true'
+    SQL_PROFILER_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', 5))
+    # Idempotency-Key replays for /transfer: key lifetime (seconds), per-process cache size and
+    # how often expired keys are deleted (seconds, 0 turns the background sweeper off)
+    IDEMPOTENCY_KEY_TTL = float(os.getenv('IDEMPOTENCY_KEY_TTL', 86400))
+    IDEMPOTENCY_CACHE_MAX_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_MAX_SIZE', 10000))
+    IDEMPOTENCY_SWEEP_INTERVAL = float(os.getenv('IDEMPOTENCY_SWEEP_INTERVAL', 300))
+    # Read replicas for GET views (comma-separated URIs, none by default); reads stay on the
+    # primary for a while after a client's write and skip replicas lagging more than REPLICA_MAX_LAG
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.getenv('DB_REPLICA_URIS', '').split(',') if uri]
+    REPLICA_READ_YOUR_WRITES_SECONDS = float(os.getenv('REPLICA_READ_YOUR_WRITES_SECONDS', 5))
+    REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 10))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 1))
+    # Destination numbers without a valid check digit are rejected before any query unless this is
+    # on; keep it on while accounts opened before check digits (20 random digits) still exist
+    ACCOUNT_NUMBER_ACCEPT_LEGACY = os.getenv('ACCOUNT_NUMBER_ACCEPT_LEGACY', 'true').lower() == 'true'
+    # How often each process reloads its exchange rate snapshot from the fx_rate table (seconds,
+    # 0 turns the background refresh off; `flask fx load` always refreshes its own process)
+    FX_REFRESH_INTERVAL = float(os.getenv('FX_REFRESH_INTERVAL', 60))
 
 class LocalConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///local.db'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:10000'
+    PASSWORD_HASH_WORKERS = 0
     DEBUG = True
 
 class GithubCIConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:10000'
+    PASSWORD_HASH_WORKERS = 0
     DEBUG = True
 
-class DevelopmentConfig(Config):
-    if os.getenv('ENV') == 'dev':
-        credential = DefaultAzureCredential()
-        SQLALCHEMY_DATABASE_URI = 'postgresql://{dbuser}:{dbpass}@{dbhost}/{dbname}'.format(
-            dbuser=urllib.parse.quote(os.getenv('DBUSER')),
-            dbpass=credential.get_token('https://ossrdbms-aad.database.windows.net/.default').token,
-            dbhost=os.getenv('DBHOST'),
-            dbname=os.getenv('DBNAME')
-        )
-    DEBUG = True
+class TestingConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:10000'
+    PASSWORD_HASH_WORKERS = 0
+    IDEMPOTENCY_SWEEP_INTERVAL = 0
+    ACCOUNT_NUMBER_ACCEPT_LEGACY = False
+    FX_REFRESH_INTERVAL = 0
+    TESTING = True
 
-class UATConfig(Config):
-    if os.getenv('ENV') == 'uat':
-        credential = DefaultAzureCredential()
-        SQLALCHEMY_DATABASE_URI = 'postgresql://{dbuser}:{dbpass}@{dbhost}/{dbname}'.format(
-            dbuser=urllib.parse.quote(os.getenv('DBUSER')),
-            dbpass=credential.get_token('https://ossrdbms-aad.database.windows.net/.default').token,
-            dbhost=os.getenv('DBHOST'),
-            dbname=os.getenv('DBNAME')
-        )
+class AzurePostgresConfig(Config):
+    """
+    Azure Database for PostgreSQL with Azure AD authentication. The URI carries
+    no password: a cached, proactively refreshed token is injected into each
+    new connection (see iebank_api/database.py).
+    """
+    SQLALCHEMY_DATABASE_URI = 'postgresql://{dbuser}@{dbhost}/{dbname}'.format(
+        dbuser=urllib.parse.quote(os.getenv('DBUSER', '')),
+        dbhost=os.getenv('DBHOST'),
+        dbname=os.getenv('DBNAME')
+    )
+    DB_CREDENTIAL_PROVIDER = os.getenv('DB_CREDENTIAL_PROVIDER', 'azure')
+    DB_TOKEN_REFRESH_MARGIN = int(os.getenv('DB_TOKEN_REFRESH_MARGIN', 300))
+    # Connection pool tuning, per gunicorn worker
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
     DEBUG = True
 
-class ProductionConfig(Config):
-    if os.getenv('ENV') == 'prod':
-        credential = DefaultAzureCredential()
-        SQLALCHEMY_DATABASE_URI = 'postgresql://{dbuser}:{dbpass}@{dbhost}/{dbname}'.format(
-            dbuser=urllib.parse.quote(os.getenv('DBUSER')),
-            dbpass=credential.get_token('https://ossrdbms-aad.database.windows.net/.default').token,
-            dbhost=os.getenv('DBHOST'),
-            dbname=os.getenv('DBNAME')
-        )
-    DEBUG = True
+class DevelopmentConfig(AzurePostgresConfig):
+    pass
+
+class UATConfig(AzurePostgresConfig):
+    pass
+
+class ProductionConfig(AzurePostgresConfig):
+    pass
@@ -0,0 +1,32 @@
+# Gunicorn server hooks; gunicorn loads this file from the working directory.
+import os
+import shutil
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+# Threaded workers: a request waiting on the password hashing pool leaves the
+# worker's other threads free, and PASSWORD_HASH_MAX_PENDING (kept below
+# `threads`) is what turns a login burst into 503s instead of a full worker
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+
+def on_starting(server):
+    # Start every deployment with an empty Prometheus multiprocess directory
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # Background threads run in the serving workers only, never in the master or CLI commands
+    from iebank_api import start_background_tasks
+    start_background_tasks(worker.wsgi)
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of a worker that has gone away
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -5,109 +5,165 @@ from flask_migrate import Migrate
 from dotenv import load_dotenv
 import os
 from flask_login import LoginManager
-from werkzeug.security import generate_password_hash
-from logging import INFO, getLogger
-from azure.monitor.opentelemetry import configure_azure_monitor
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
 
-# Load environment variables
-load_dotenv()
+from iebank_api.replicas import RoutingSession
 
-# Initialize Flask App
-app = Flask(__name__)
+# Extensions are created unbound and attached to an app in create_app(), so
+# importing the package does no I/O and touches no database.
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+migrate = Migrate()
 login_manager = LoginManager()
 
-# Configure the environment based on the ENV variable
-env = os.getenv('ENV', 'local')
-if env == 'local':
-    print("Running in local mode")
-    app.config.from_object('config.LocalConfig')
-elif env == 'dev':
-    print("Running in development mode")
-    app.config.from_object('config.DevelopmentConfig')
-elif env == 'ghci':
-    print("Running in GitHub CI mode")
-    app.config.from_object('config.GithubCIConfig')
-elif env == 'uat':
-    print("Running in UAT mode")
-    app.config.from_object('config.UATConfig')
-else:
-    print("Running in production mode for now!")
-    app.config.from_object('config.ProductionConfig')
-
-# Set a secret key for session management and Flask-Login
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'aswin')
-
-# Application Insights Configuration using Connection String
-connection_string = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
-if connection_string:
-    print("Configuring Azure Monitor", connection_string)
-    configure_azure_monitor(connection_string=connection_string)
-    FlaskInstrumentor().instrument_app(app)
-
-# Configure Azure Monitor Logging
-logger = getLogger("my_application_logger")
-logger.setLevel(INFO)
-
-# Child logger to demonstrate hierarchy tracking
-logger_child = getLogger("my_application_logger.module")
-logger_child.setLevel(INFO)
-print("Logger name:", logger_child.name)
-
-# Example of logging statements to verify the setup
-logger.info("Application started - info log")
-logger.warning("Application started - warning log")
-logger.error("Application started - error log")
-
-# Logger that will not be tracked by Azure Monitor
-logger_not_tracked = getLogger("not_my_application_logger")
-logger_not_tracked.setLevel(INFO)
-
-logger_not_tracked.info("Info log - will not be tracked")
-logger_not_tracked.warning("Warning log - will not be tracked")
-logger_not_tracked.error("Error log - will not be tracked")
-
-# Initialize extensions
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login_manager.init_app(app)
+# Config object for each value of the ENV variable; anything else is production
+CONFIGS = {
+    'local': 'config.LocalConfig',
+    'dev': 'config.DevelopmentConfig',
+    'ghci': 'config.GithubCIConfig',
+    'uat': 'config.UATConfig',
+}
 
 # Set the login view and messages
-login_manager.login_view = 'login'
+login_manager.login_view = 'api.login'
 login_manager.login_message = "Please log in to access this page."
 login_manager.login_message_category = "info"
 
-# User loader callback for Flask-Login
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
 
 # Unauthorized handler for JSON response
 @login_manager.unauthorized_handler
 def unauthorized():
     return jsonify({"error": "Unauthorized", "message": "Authentication required"}), 401
 
-# Enable Cross-Origin Resource Sharing (CORS)
-CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}})
-
-# Import models to register them with SQLAlchemy
-from iebank_api.models import Account, User, TransactionType, Transaction
-
-# Initialize database and create tables if they don't exist
-with app.app_context():
-    db.create_all()
-    # Create an admin user if none exists
-    # list all users in the database
-    users = User.query.all()
-    admin = None
-    for user in users:
-        if user.admin:
-            admin = user
-            break
-    if not admin:
-        admin = User("admin", "admin@example.com", generate_password_hash("admin_password"), True)
-        db.session.add(admin)
-        db.session.commit()
-
-# Import routes to register endpoints
-from iebank_api import routes
+
+def create_app(config_object=None):
+    """
+    Build and configure the Flask app.
+
+    `config_object` overrides the config class picked from the ENV variable.
+    Schema creation and the admin bootstrap are not run here; use
+    `flask init-db` (see iebank_api/commands.py).
+    """
+    # Load environment variables
+    load_dotenv()
+
+    # Initialize Flask App
+    app = Flask(__name__)
+
+    # Configure the environment based on the ENV variable
+    env = os.getenv('ENV', 'local')
+    app.config.from_object(config_object or CONFIGS.get(env, 'config.ProductionConfig'))
+
+    # Set a secret key for session management and Flask-Login
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'aswin')
+
+    # JSON logs written by a background thread, never on the request thread
+    from iebank_api.logs import configure_logging
+    configure_logging(app)
+
+    # orjson-backed jsonify when available
+    from iebank_api.encoding import configure_json
+    configure_json(app)
+
+    # Application Insights Configuration using Connection String
+    connection_string = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
+    if connection_string:
+        # Imported here: the Azure exporters are slow to import and only needed when enabled
+        from azure.monitor.opentelemetry import configure_azure_monitor
+        from opentelemetry.instrumentation.flask import FlaskInstrumentor
+        configure_azure_monitor(connection_string=connection_string)
+        FlaskInstrumentor().instrument_app(app)
+
+    # Read replicas become extra binds, one engine each
+    from iebank_api.replicas import replica_binds
+    replicas = replica_binds(app.config['SQLALCHEMY_REPLICA_URIS'])
+    app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}), **replicas}
+
+    # Initialize extensions; engines and connections are created on first use
+    db.init_app(app)
+    migrate.init_app(app, db)
+    login_manager.init_app(app)
+
+    # Inject a fresh access token into every new database connection
+    from iebank_api.database import init_token_auth
+    with app.app_context():
+        init_token_auth(app.config, db.engine)
+
+        # GET views marked replica_reads are served round-robin from the replicas
+        if replicas:
+            from iebank_api import replicas as replica_routing
+            for key in replicas:
+                init_token_auth(app.config, db.engines[key])
+            replica_routing.init_app(app, [db.engines[key] for key in replicas])
+
+        # Prometheus /metrics with latency histograms and pool gauges
+        if app.config['METRICS_ENABLED']:
+            from iebank_api import metrics
+            metrics.init_app(app, db.engine)
+
+        # Query count, DB time and N+1 detection per request
+        if app.config['SQL_PROFILER_ENABLED']:
+            from iebank_api.profiling import sql_profiler
+            sql_profiler.init_app(app, db.engine)
+
+    # Size and lifetime of the authenticated-user cache
+    from iebank_api.cache import user_cache
+    user_cache.configure(maxsize=app.config['USER_CACHE_MAX_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+    # Stored /transfer responses for Idempotency-Key replays
+    from iebank_api.idempotency import idempotency_store
+    idempotency_store.configure(ttl=app.config['IDEMPOTENCY_KEY_TTL'], maxsize=app.config['IDEMPOTENCY_CACHE_MAX_SIZE'])
+
+    # Whether account numbers from before the check-digit scheme are still looked up
+    from iebank_api.account_numbers import account_number_allocator
+    account_number_allocator.configure(accept_legacy=app.config['ACCOUNT_NUMBER_ACCEPT_LEGACY'])
+
+    # Password hashing runs in a bounded process pool off the request thread
+    from iebank_api.hashing import password_hasher
+    password_hasher.configure(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+    )
+
+    # Enable Cross-Origin Resource Sharing (CORS)
+    CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}})
+
+    # Register endpoints and CLI commands
+    from iebank_api.routes import api
+    from iebank_api.commands import (init_db_command, seed_command, rollups_group, ledger_group, reconcile_command,
+                                     fx_group)
+    app.register_blueprint(api)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(rollups_group)
+    app.cli.add_command(ledger_group)
+    app.cli.add_command(reconcile_command)
+    app.cli.add_command(fx_group)
+
+    return app
+
+
+def start_background_tasks(app):
+    """
+    Start the threads a serving process needs. Called by serving processes
+    only (gunicorn's post_worker_init hook, `python app.py`), so CLI
+    commands and tests have no side effects beyond building the app.
+    """
+    # Deletes expired idempotency keys
+    if app.config['IDEMPOTENCY_SWEEP_INTERVAL'] > 0:
+        from iebank_api.idempotency import idempotency_store
+        idempotency_store.start_sweeper(app, app.config['IDEMPOTENCY_SWEEP_INTERVAL'])
+
+    # Exchange rates for cross-currency transfers, reloaded into an in-process snapshot
+    if app.config['FX_REFRESH_INTERVAL'] > 0:
+        from iebank_api.fx import fx_rates
+        fx_rates.start_refresher(app, app.config['FX_REFRESH_INTERVAL'])
+
+
+# Import models to register them with SQLAlchemy; only the side effect is needed, nothing here uses the names
+from iebank_api.models import (Account, User, TransactionType, Transaction, IdempotencyKey, AccountRollup,  # noqa: F401
+                               LedgerPosting, BalanceSnapshot, ReconciliationMismatch, FxRate)
+
+# User loader callback for Flask-Login, backed by a per-process identity cache
+from iebank_api.auth import load_user
+login_manager.user_loader(load_user)
@@ -0,0 +1,137 @@
+import os
+import threading
+
+from sqlalchemy import insert, select, update
+
+from iebank_api import db
+
+# -------------- ACCOUNT NUMBERS --------------------------------------------------
+#
+# Account numbers are 19 digits from a database-wide counter followed by a
+# Luhn check digit, so they never collide and a mistyped number is caught
+# without a query. On PostgreSQL each process reserves a block of
+# BLOCK_SIZE numbers with one nextval() and hands them out from memory.
+# Numbers issued before this scheme are 20 random digits; they are still
+# accepted while ACCOUNT_NUMBER_ACCEPT_LEGACY is on.
+
+ACCOUNT_NUMBER_LENGTH = 20
+BLOCK_SIZE = 1000
+
+# nextval() is not transactional, so a block is never handed out twice, even
+# if the account that reserved it is rolled back
+account_number_sequence = db.Sequence('account_number_block_seq', start=1, increment=BLOCK_SIZE,
+                                      metadata=db.metadata)
+
+# Databases without sequences keep the counter in a row instead
+account_number_counter = db.Table(
+    'account_number_counter',
+    db.Column('name', db.String(32), primary_key=True),
+    db.Column('next_value', db.BigInteger, nullable=False),
+)
+_COUNTER = 'account'
+
+# Luhn doubles every second digit from the right; this is the digit sum of 2 * d
+_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+
+
+def check_digit(body):
+    """
+    Luhn check digit for a string of digits.
+    """
+    total = 0
+    for position, digit in enumerate(reversed(body)):
+        total += _DOUBLED[int(digit)] if position % 2 == 0 else int(digit)
+    return str(-total % 10)
+
+
+def format_number(value):
+    """
+    The account number for counter value `value`.
+    """
+    body = f"{value:0{ACCOUNT_NUMBER_LENGTH - 1}d}"
+    return body + check_digit(body)
+
+
+def well_formed(number):
+    return (isinstance(number, str) and len(number) == ACCOUNT_NUMBER_LENGTH
+            and number.isascii() and number.isdigit())
+
+
+def has_valid_check_digit(number):
+    return well_formed(number) and check_digit(number[:-1]) == number[-1]
+
+
+def _bump_counter(connection, count):
+    # Returns the new end of the counter; values end - count .. end - 1 are ours
+    table = account_number_counter
+    end = connection.scalar(
+        update(table).where(table.c.name == _COUNTER)
+        .values(next_value=table.c.next_value + count)
+        .returning(table.c.next_value)
+    )
+    if end is None:
+        end = 1 + count
+        connection.execute(insert(table).values(name=_COUNTER, next_value=end))
+    return end
+
+
+class AccountNumberAllocator:
+    """
+    Hands out account numbers and pre-checks numbers supplied by clients.
+    """
+
+    def __init__(self, accept_legacy=True):
+        self.accept_legacy = accept_legacy
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = self._end = 0
+
+    def configure(self, accept_legacy=None):
+        if accept_legacy is not None:
+            self.accept_legacy = accept_legacy
+
+    def accepts(self, number):
+        """
+        Whether `number` could belong to an account, without a database
+        round trip: 20 digits and, unless legacy numbers are accepted, a
+        valid check digit.
+        """
+        if not well_formed(number):
+            return False
+        return self.accept_legacy or has_valid_check_digit(number)
+
+    def allocate(self, connection):
+        """
+        Next account number for a new account inserted on `connection`.
+        """
+        if not connection.dialect.supports_sequences:
+            # The counter row is updated inside the caller's transaction, so a
+            # rolled-back account gives its number back; SQLite has one writer anyway
+            return format_number(_bump_counter(connection, 1) - 1)
+
+        with self._lock:
+            # A block inherited across fork belongs to the parent process
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._next = connection.scalar(select(account_number_sequence.next_value()))
+                self._end = self._next + BLOCK_SIZE
+                self._pid = os.getpid()
+            value = self._next
+            self._next += 1
+        return format_number(value)
+
+    def reserve(self, connection, count):
+        """
+        Reserve `count` account numbers at once, for bulk inserts.
+        """
+        if not connection.dialect.supports_sequences:
+            end = _bump_counter(connection, count)
+            return [format_number(value) for value in range(end - count, end)]
+        numbers = []
+        while len(numbers) < count:
+            start = connection.scalar(select(account_number_sequence.next_value()))
+            size = min(BLOCK_SIZE, count - len(numbers))
+            numbers.extend(format_number(value) for value in range(start, start + size))
+        return numbers
+
+
+account_number_allocator = AccountNumberAllocator()
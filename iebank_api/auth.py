@@ -0,0 +1,50 @@
+from flask_login import UserMixin
+
+from iebank_api import db
+from iebank_api.cache import user_cache
+from iebank_api.models import User
+
+# -------------- AUTHENTICATED USER LOADING -------------------------------------
+
+
+class UserIdentity(UserMixin):
+    """
+    Lightweight, immutable stand-in for `User` used as `current_user`.
+    It carries only the columns request handlers read, so it is safe to
+    cache across requests.
+    """
+
+    __slots__ = ("id", "username", "email", "admin", "status")
+
+    def __init__(self, id, username, email, admin, status):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.admin = admin
+        self.status = status
+
+    @property
+    def is_active(self):
+        return self.status == "Active"
+
+    def __repr__(self):
+        return f'<UserIdentity {self.username}>'
+
+
+def _load_identity(user_id):
+    row = db.session.execute(
+        db.select(User.id, User.username, User.email, User.admin, User.status)
+        .where(User.id == user_id)
+    ).first()
+    return UserIdentity(*row) if row else None
+
+
+def load_user(user_id):
+    """
+    Flask-Login user loader: served from the per-process cache when possible.
+    """
+    return user_cache.get_or_load(int(user_id), _load_identity)
+
+
+def invalidate_user(user_id):
+    user_cache.invalidate(int(user_id))
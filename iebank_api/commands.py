@@ -0,0 +1,182 @@
+import os
+import random
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_migrate import upgrade
+from sqlalchemy import exists, inspect, select, text
+
+from iebank_api import db
+from iebank_api.fx import fx_rates, read_rates
+from iebank_api.hashing import password_hasher
+from iebank_api.models import TRANSACTION_FTS_DDL, TRANSACTION_FTS_TABLE, User
+from iebank_api.ledger import SNAPSHOT_SETTLE_SECONDS, backfill_opening_balances, backfill_postings, take_snapshots
+from iebank_api.reconciliation import TOLERANCE, reconcile
+from iebank_api.rollups import rebuild_rollups
+from iebank_api.seeding import SEED_PASSWORD, seed_database
+
+# -------------- FLASK CLI COMMANDS -----------------------------------------------
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create missing tables, upgrade existing ones and bootstrap an admin user if none exists."""
+    db.create_all()
+
+    # create_all never alters a table that already exists; the migrations add
+    # the columns and indexes that older databases are missing
+    upgrade()
+
+    # Databases created before description search existed lack the SQLite FTS index
+    if db.engine.dialect.name == 'sqlite' and not inspect(db.engine).has_table(TRANSACTION_FTS_TABLE):
+        with db.engine.begin() as connection:
+            for statement in TRANSACTION_FTS_DDL:
+                connection.execute(text(statement))
+            connection.execute(text(
+                f"INSERT INTO {TRANSACTION_FTS_TABLE}({TRANSACTION_FTS_TABLE}) VALUES ('rebuild')"))
+        click.echo("Built the transaction search index.")
+
+    # A single EXISTS probe, independent of the size of the user table
+    if not db.session.scalar(select(exists().where(User.admin.is_(True)))):
+        admin = User(
+            "admin",
+            "admin@example.com",
+            password_hasher.hash(os.getenv('ADMIN_PASSWORD', 'admin_password')),
+            True,
+        )
+        db.session.add(admin)
+        db.session.commit()
+        click.echo("Created admin user.")
+    click.echo("Database initialised.")
+
+
+@click.command('seed')
+@click.option('--users', default=1000, show_default=True, help="Users to create.")
+@click.option('--accounts-per-user', default=1, show_default=True)
+@click.option('--transactions', default=10000, show_default=True,
+              help="Transfers, on top of one opening deposit per account.")
+@click.option('--days', default=365, show_default=True, help="Spread transaction timestamps over this many days.")
+@click.option('--batch-size', default=5000, show_default=True, help="Rows per INSERT/COPY batch.")
+@click.option('--password', default=SEED_PASSWORD, show_default=True, help="Password shared by every seeded user.")
+@click.option('--random-seed', type=int, help="Make the generated data reproducible.")
+@with_appcontext
+def seed_command(users, accounts_per_user, transactions, days, batch_size, password, random_seed):
+    """Bulk-generate users, accounts and transactions for staging and benchmarks."""
+    db.create_all()
+
+    # One hash shared by every seeded user
+    password_hash = password_hasher.hash(password)
+
+    started = time.perf_counter()
+    counts = seed_database(
+        db.engine, users, password_hash,
+        accounts_per_user=accounts_per_user, transactions=transactions, days=days,
+        batch_size=batch_size, rng=random.Random(random_seed),
+    )
+    elapsed = max(time.perf_counter() - started, 1e-9)
+
+    rows = sum(counts.values())
+    for table, count in counts.items():
+        click.echo(f"{table}: {count}")
+    click.echo(f"Seeded {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s).")
+
+    # Seeded rows bypass the transfer engine, so derive their rollups from the ledger
+    started = time.perf_counter()
+    written = rebuild_rollups(db.engine)
+    click.echo(f"Rebuilt {written} rollup rows in {time.perf_counter() - started:.2f}s.")
+
+
+@click.group('rollups')
+def rollups_group():
+    """Maintain the per-account daily and monthly rollups."""
+
+
+@rollups_group.command('rebuild')
+@click.option('--workers', default=4, show_default=True, help="Chunks rebuilt in parallel (1 on SQLite).")
+@click.option('--chunk-size', default=1000, show_default=True, help="Accounts per chunk and transaction.")
+@with_appcontext
+def rebuild_rollups_command(workers, chunk_size):
+    """Recompute every account's rollups from the transaction ledger."""
+    started = time.perf_counter()
+    written = rebuild_rollups(db.engine, workers=workers, chunk_size=chunk_size)
+    click.echo(f"Rebuilt {written} rollup rows in {time.perf_counter() - started:.2f}s.")
+
+
+@click.group('ledger')
+def ledger_group():
+    """Maintain the double-entry ledger and its balance snapshots."""
+
+
+@ledger_group.command('snapshot')
+@click.option('--settle-seconds', default=SNAPSHOT_SETTLE_SECONDS, show_default=True,
+              help="Leave postings younger than this for the next snapshot.")
+@with_appcontext
+def snapshot_command(settle_seconds):
+    """Snapshot the balance of every account with new postings."""
+    started = time.perf_counter()
+    taken = take_snapshots(db.session, settle_seconds=settle_seconds)
+    db.session.commit()
+    click.echo(f"Took {taken} balance snapshots in {time.perf_counter() - started:.2f}s.")
+
+
+@ledger_group.command('backfill')
+@click.option('--batch-size', default=5000, show_default=True, help="Transactions or accounts per commit.")
+@with_appcontext
+def backfill_command(batch_size):
+    """Write ledger postings for transactions and opening balances recorded before the ledger."""
+    started = time.perf_counter()
+    posted = backfill_postings(db.session, batch_size=batch_size)
+    opened = backfill_opening_balances(db.session, batch_size=batch_size)
+    click.echo(f"Posted {posted} transactions and {opened} opening balances in {time.perf_counter() - started:.2f}s.")
+
+    # The backfilled postings bypassed the transfer engine, so derive the rollups from the ledger
+    if posted or opened:
+        written = rebuild_rollups(db.engine)
+        click.echo(f"Rebuilt {written} rollup rows.")
+
+
+@click.command('reconcile')
+@click.option('--workers', type=int, default=None, help="Worker processes  [default: one per CPU]")
+@click.option('--chunk-size', default=5000, show_default=True, help="Accounts per task.")
+@click.option('--tolerance', default=TOLERANCE, show_default=True, help="Largest difference treated as equal.")
+@with_appcontext
+def reconcile_command(workers, chunk_size, tolerance):
+    """Check every account balance against its transactions.
+
+    Mismatches are written to the reconciliation_mismatch table under the
+    run id printed at the end; the command exits with status 1 if any
+    were found.
+    """
+    started = time.perf_counter()
+    run_id, checked, mismatches = reconcile(db.engine, workers=workers, chunk_size=chunk_size,
+                                            tolerance=tolerance, config=current_app.config)
+    click.echo(f"Checked {checked} accounts in {time.perf_counter() - started:.2f}s: "
+               f"{mismatches} mismatches (run {run_id}).")
+    if mismatches:
+        raise SystemExit(1)
+
+
+@click.group('fx')
+def fx_group():
+    """Manage the exchange rates used by cross-currency transfers."""
+
+
+@fx_group.command('load')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@with_appcontext
+def fx_load_command(path):
+    """Replace the rate table with the rates in PATH.
+
+    PATH is a CSV file with base,quote,rate columns or a JSON file mapping
+    each base currency to {quote: rate}. A rate is the number of quote units
+    per base unit; the inverse pair is derived when it is not listed.
+    """
+    try:
+        rows = read_rates(path)
+    except (KeyError, ValueError) as e:
+        raise click.ClickException(f"Invalid rates file: {e}")
+    loaded = fx_rates.load(db.session, rows)
+    click.echo(f"Loaded {loaded} exchange rates.")
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+# -------------- DATABASE ENGINE SETUP ------------------------------------------
+
+AZURE_POSTGRES_SCOPE = 'https://ossrdbms-aad.database.windows.net/.default'
+
+
+class AzureCredentialProvider:
+    """
+    Fetches Azure AD access tokens for Azure Database for PostgreSQL.
+    `azure.identity` is imported on first use so it stays off the import path.
+    """
+
+    def __init__(self, scope=AZURE_POSTGRES_SCOPE):
+        self.scope = scope
+        self._credential = None
+
+    def get_token(self):
+        """
+        Return `(token, expires_on)` with `expires_on` as a Unix timestamp.
+        """
+        if self._credential is None:
+            from azure.identity import DefaultAzureCredential
+            self._credential = DefaultAzureCredential()
+        access_token = self._credential.get_token(self.scope)
+        return access_token.token, access_token.expires_on
+
+
+class StaticCredentialProvider:
+    """
+    Hands out a fixed password as if it were a token that lives `lifetime`
+    seconds. Used for local PostgreSQL and in tests.
+    """
+
+    def __init__(self, token, lifetime=3600, clock=time.time):
+        self.token = token
+        self.lifetime = lifetime
+        self.clock = clock
+
+    def get_token(self):
+        return self.token, self.clock() + self.lifetime
+
+
+class CachedToken:
+    """
+    Caches the provider's token and refreshes it `refresh_margin` seconds
+    before it expires, so new connections never present an expired token.
+    If a refresh fails while the old token is still valid, the old one is used.
+    """
+
+    def __init__(self, provider, refresh_margin=300, clock=time.time):
+        self.provider = provider
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self._token = None
+        self._expires_on = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            now = self.clock()
+            if self._token is None or now >= self._expires_on - self.refresh_margin:
+                try:
+                    self._token, self._expires_on = self.provider.get_token()
+                except Exception:
+                    if self._token is None or now >= self._expires_on:
+                        raise
+            return self._token
+
+
+def install_token_auth(engine, token):
+    """
+    Present `token.get()` as the password of every new DBAPI connection
+    opened by `engine`.
+    """
+    @event.listens_for(engine, "do_connect")
+    def provide_token(dialect, connection_record, cargs, cparams):
+        cparams["password"] = token.get()
+
+    return provide_token
+
+
+def make_credential_provider(config):
+    """
+    Build the provider named by `DB_CREDENTIAL_PROVIDER` in `config`. Any
+    object with a `get_token()` method may also be set there directly.
+    """
+    provider = config.get('DB_CREDENTIAL_PROVIDER')
+    if provider == 'azure':
+        return AzureCredentialProvider(config.get('DB_TOKEN_SCOPE', AZURE_POSTGRES_SCOPE))
+    if provider == 'static':
+        return StaticCredentialProvider(os.getenv('DBPASS', ''))
+    if provider is None or hasattr(provider, 'get_token'):
+        return provider
+    raise ValueError(f"Unknown DB_CREDENTIAL_PROVIDER: {provider!r}")
+
+
+def init_token_auth(config, engine):
+    """
+    Wire token authentication into `engine` when the app config (or any
+    mapping with the same keys) asks for it.
+    """
+    provider = make_credential_provider(config)
+    if provider is None:
+        return None
+    token = CachedToken(provider, refresh_margin=config.get('DB_TOKEN_REFRESH_MARGIN', 300))
+    install_token_auth(engine, token)
+    return token
@@ -0,0 +1,52 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the standard library
+    orjson = None
+
+# -------------- JSON ENCODING ----------------------------------------------------
+#
+# orjson encodes the large transaction listings several times faster than the
+# standard library. Output matches Flask's default provider: sorted keys, and
+# dates, decimals and UUIDs still go through Flask's own `default`.
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj):
+    """
+    Encode `obj` as a compact JSON string.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=_OPTIONS).decode()
+    return json.dumps(obj, default=DefaultJSONProvider.default)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson, used by `jsonify` and `request.json`.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Hand orjson's bytes straight to the response, without a str round trip
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=_OPTIONS),
+                                        mimetype=self.mimetype)
+
+
+def configure_json(app):
+    """
+    Use orjson for the app's JSON when it is installed.
+    """
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
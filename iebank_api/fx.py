@@ -0,0 +1,160 @@
+import csv
+import json
+import logging
+import math
+import threading
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+
+from sqlalchemy import delete, insert, select
+
+from iebank_api import db
+from iebank_api.models import FxRate
+
+# -------------- FOREIGN EXCHANGE RATES -------------------------------------------
+#
+# Rates live in the fx_rate table, filled from a file by `flask fx load`.
+# Each process reads the whole table into an immutable snapshot and replaces
+# it wholesale on refresh; a conversion takes the current snapshot once and
+# never touches the database, and concurrent readers see either the old
+# rates or the new ones, never a mix.
+
+logger = logging.getLogger(__name__)
+
+FxSnapshot = namedtuple('FxSnapshot', 'rates loaded_at')
+
+
+class UnknownRate(LookupError):
+    """
+    Raised when no rate converts between two currencies.
+    """
+
+
+def normalize_currency(code):
+    """
+    The upper-case ISO 4217 form of `code`; raises ValueError unless it is
+    three letters.
+    """
+    code = str(code or '').strip().upper()
+    if len(code) != 3 or not (code.isascii() and code.isalpha()):
+        raise ValueError(f"Invalid currency code: {code!r}")
+    return code
+
+
+def convert(snapshot, amount, base, quote):
+    """
+    Convert `amount` of `base` into `quote` with the rates of `snapshot`.
+    Returns (rate, converted amount rounded to cents). Codes compare case
+    insensitively, and a pair missing from the table is served by its inverse.
+    """
+    # Accounts opened before codes were normalised may hold "eur"
+    base, quote = base.strip().upper(), quote.strip().upper()
+    if base == quote:
+        return 1.0, amount
+    rate = snapshot.rates.get((base, quote))
+    if rate is None:
+        inverse = snapshot.rates.get((quote, base))
+        if inverse is None:
+            raise UnknownRate(f"No exchange rate from {base} to {quote}.")
+        rate = 1 / inverse
+    return rate, round(amount * rate, 2)
+
+
+def read_rates(path):
+    """
+    Parse a rates file: CSV with `base,quote,rate` columns, or JSON mapping
+    base to {quote: rate}. Returns a list of (base, quote, rate).
+    """
+    with open(path, newline='') as f:
+        if path.endswith('.json'):
+            rows = [(base, quote, rate) for base, quotes in json.load(f).items() for quote, rate in quotes.items()]
+        else:
+            rows = [(row['base'], row['quote'], row['rate']) for row in csv.DictReader(f)]
+
+    parsed = []
+    for base, quote, rate in rows:
+        try:
+            base, quote = normalize_currency(base), normalize_currency(quote)
+        except ValueError:
+            raise ValueError(f"Invalid currency pair: {base}/{quote}")
+        try:
+            rate = float(rate)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid rate for {base}/{quote}: {rate!r}")
+        if base == quote:
+            raise ValueError(f"Invalid currency pair: {base}/{quote}")
+        if not math.isfinite(rate) or rate <= 0:
+            raise ValueError(f"Invalid rate for {base}/{quote}: {rate}")
+        parsed.append((base, quote, rate))
+    return parsed
+
+
+class FxRates:
+    """
+    The process-wide rate snapshot and its refresh.
+    """
+
+    def __init__(self):
+        self._snapshot = FxSnapshot(MappingProxyType({}), None)
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def convert(self, amount, base, quote):
+        return convert(self._snapshot, amount, base, quote)
+
+    def refresh(self, session):
+        """
+        Replace the snapshot with the current contents of the rate table.
+        Returns the number of rates loaded.
+        """
+        rates = {
+            (base.upper(), quote.upper()): rate
+            for base, quote, rate in session.execute(
+                select(FxRate.base_currency, FxRate.quote_currency, FxRate.rate))
+        }
+        # A single reference assignment: readers never see a half-built table
+        self._snapshot = FxSnapshot(MappingProxyType(rates), datetime.utcnow())
+        return len(rates)
+
+    def load(self, session, rows):
+        """
+        Replace the rate table with `rows` of (base, quote, rate), commit,
+        and refresh this process's snapshot. Other processes pick the rates
+        up on their next refresh.
+        """
+        now = datetime.utcnow()
+        session.execute(delete(FxRate))
+        if rows:
+            session.execute(insert(FxRate), [
+                {"base_currency": normalize_currency(base), "quote_currency": normalize_currency(quote),
+                 "rate": rate, "updated_at": now}
+                for base, quote, rate in rows
+            ])
+        session.commit()
+        return self.refresh(session)
+
+    def start_refresher(self, app, interval):
+        """
+        Load the rates now and every `interval` seconds on a daemon thread.
+        Returns an Event that stops the thread when set.
+        """
+        stopped = threading.Event()
+
+        def run():
+            while True:
+                try:
+                    with app.app_context():
+                        self.refresh(db.session)
+                except Exception:
+                    logger.exception("Exchange rate refresh failed")
+                if stopped.wait(interval):
+                    return
+
+        threading.Thread(target=run, name="fx-refresher", daemon=True).start()
+        return stopped
+
+
+fx_rates = FxRates()
@@ -0,0 +1,88 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# -------------- PASSWORD HASHING SERVICE ----------------------------------------
+
+
+class HashingBusy(Exception):
+    """
+    Raised when too many hashing jobs are already waiting; maps to a 503.
+    """
+
+
+class PasswordHasher:
+    """
+    Runs Werkzeug's password hashing off the request thread.
+
+    Jobs go to a small process pool so a burst of logins cannot pin every
+    gunicorn worker on CPU. At most `max_pending` jobs may be queued or
+    running per process; beyond that callers fail fast with `HashingBusy`.
+    The limit only bites when a worker serves requests on several threads
+    (gunicorn.conf.py runs gthread workers), so keep it below the thread
+    count.
+    With `workers=0` hashing runs inline, which is what tests and local
+    development use.
+    """
+
+    def __init__(self, method="scrypt", workers=0, max_pending=4, timeout=10.0):
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.configure(method, workers, max_pending, timeout)
+
+    def configure(self, method, workers, max_pending, timeout):
+        self.shutdown()
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._method_prefix = None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """
+        True when `pwhash` was made with a different method or cost than
+        the one currently configured.
+        """
+        if self._method_prefix is None:
+            self._method_prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        return pwhash.split("$", 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Too many password operations in progress.")
+        try:
+            if not self.workers:
+                return func(*args)
+            try:
+                return self._pool().submit(func, *args).result(timeout=self.timeout)
+            except TimeoutError:
+                raise HashingBusy("Password operation timed out.")
+        finally:
+            self._slots.release()
+
+    def _pool(self):
+        # Created lazily so each gunicorn worker gets its own pool after fork
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from iebank_api import db
+from iebank_api.cache import TTLCache
+from iebank_api.encoding import dumps
+from iebank_api.models import IdempotencyKey
+
+# -------------- IDEMPOTENCY KEYS -------------------------------------------------
+#
+# A retried request carrying the same Idempotency-Key gets the stored
+# response back instead of running again. The key row is added to the
+# session before the transfer commits, so it is persisted only if the
+# transfer is, and the unique (user_id, key) constraint stops two concurrent
+# retries from both applying.
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+StoredResponse = namedtuple('StoredResponse', 'fingerprint status_code body')
+
+
+def request_fingerprint(data):
+    """
+    SHA-256 of the request payload with sorted keys, so a retry matches
+    even if the client serialises its JSON differently.
+    """
+    return hashlib.sha256(dumps(data).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Stored responses, served from a bounded per-process cache first and the
+    database second.
+    """
+
+    def __init__(self, ttl=86400, maxsize=10000, clock=datetime.utcnow):
+        self.ttl = ttl
+        self.clock = clock
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def configure(self, ttl=None, maxsize=None):
+        if ttl is not None:
+            self.ttl = ttl
+        self.cache.configure(maxsize=maxsize, ttl=ttl)
+
+    def lookup(self, session, user_id, key):
+        """
+        Return the unexpired `StoredResponse` for this user's key, or None.
+        """
+        stored = self.cache.get((user_id, key))
+        if stored is not None:
+            return stored
+        row = session.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.response_body)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+                   IdempotencyKey.expires_at > self.clock())
+        ).first()
+        if row is None:
+            return None
+        stored = StoredResponse(*row)
+        self.cache.set((user_id, key), stored)
+        return stored
+
+    def stage(self, session, user_id, key, fingerprint, status_code, body):
+        """
+        Add the response to `session` without committing; it is written by
+        the commit of the work it describes. An expired row for the same key
+        that the sweeper has not reached yet is replaced. Returns the
+        `StoredResponse`.
+        """
+        now = self.clock()
+        session.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.expires_at <= now))
+        session.add(IdempotencyKey(
+            user_id=user_id, key=key, fingerprint=fingerprint, status_code=status_code,
+            response_body=body, created_at=now, expires_at=now + timedelta(seconds=self.ttl),
+        ))
+        return StoredResponse(fingerprint, status_code, body)
+
+    def remember(self, user_id, key, stored):
+        """
+        Cache a response once its transaction has committed.
+        """
+        self.cache.set((user_id, key), stored)
+
+    def sweep(self, session, batch_size=1000):
+        """
+        Delete expired keys `batch_size` rows at a time, committing after
+        each batch. Returns the number of rows deleted.
+        """
+        expired = (
+            select(IdempotencyKey.id)
+            .where(IdempotencyKey.expires_at <= self.clock())
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        deleted = 0
+        while True:
+            count = session.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(expired))).rowcount
+            session.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+    def start_sweeper(self, app, interval):
+        """
+        Run `sweep` every `interval` seconds on a daemon thread. Returns an
+        Event that stops the thread when set.
+        """
+        stopped = threading.Event()
+
+        def run():
+            while not stopped.wait(interval):
+                try:
+                    with app.app_context():
+                        deleted = self.sweep(db.session)
+                    if deleted:
+                        logger.info("Expired idempotency keys deleted", extra={"deleted": deleted})
+                except Exception:
+                    logger.exception("Idempotency key sweep failed")
+
+        threading.Thread(target=run, name="idempotency-sweeper", daemon=True).start()
+        return stopped
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,207 @@
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from sqlalchemy import DateTime, and_, exists, func, insert, literal, select
+
+from iebank_api.models import Account, BalanceSnapshot, LedgerPosting, Transaction, TransactionType, bump_data_version
+from iebank_api.reconciliation import mismatched_balances
+
+# -------------- DOUBLE-ENTRY LEDGER ----------------------------------------------
+#
+# Every Transaction is mirrored by balancing postings in integer minor units, and
+# balances are read as "latest snapshot + postings after it". Snapshots are
+# taken periodically (`flask ledger snapshot`), which bounds the tail.
+
+MINOR_UNITS = 100
+
+# Largest amount accepted anywhere: its minor units stay exact in a float and
+# fit a signed 64-bit posting with room left to sum many of them
+MAX_AMOUNT = (2 ** 53 - 1) // MINOR_UNITS
+
+# Postings newer than this are left for the next snapshot, so a transaction
+# that took its id early but committed late is not skipped
+SNAPSHOT_SETTLE_SECONDS = 60
+
+# Description of the transaction that brings an account's opening balance into the ledger
+OPENING_BALANCE = 'Opening balance'
+
+
+def to_minor(amount):
+    """
+    Convert a decimal amount to integer minor units, rounding half to even.
+    """
+    return int((Decimal(str(amount)) * MINOR_UNITS).to_integral_value(ROUND_HALF_EVEN))
+
+
+def from_minor(amount_minor):
+    return amount_minor / MINOR_UNITS
+
+
+def postings_for(transaction_id, account_id, sent_account_id, transaction_type, amount, created_at,
+                 converted_amount=None):
+    """
+    The balancing postings of one transaction. Deposits come from, and
+    withdrawals go to, the outside world (account_id NULL). A transfer that
+    credits a different amount than it debits (a currency conversion) is
+    split into two pairs through the outside world, each balanced in its
+    own currency.
+    """
+    if transaction_type == TransactionType.DEPOSIT:
+        source, target = None, account_id
+    elif transaction_type == TransactionType.WITHDRAW:
+        source, target = account_id, None
+    else:
+        source, target = account_id, sent_account_id
+    debited = to_minor(amount)
+    credited = debited if converted_amount is None else to_minor(converted_amount)
+    legs = [(source, -debited), (target, credited)]
+    if credited != debited:
+        legs[1:1] = [(None, debited), (None, -credited)]
+    return [
+        {"transaction_id": transaction_id, "account_id": leg_account, "amount_minor": minor,
+         "created_at": created_at}
+        for leg_account, minor in legs
+    ]
+
+
+def record_postings(session, transactions):
+    """
+    Insert the postings of `transactions`, given as
+    `(id, account_id, sent_account_id, transaction_type, amount, created_at[, converted_amount])`
+    tuples, with one executemany. Call it in the transaction that writes them.
+    """
+    rows = [posting for transaction in transactions for posting in postings_for(*transaction)]
+    if rows:
+        session.execute(insert(LedgerPosting.__table__), rows)
+
+
+def balance_minor(session, account_id, at=None):
+    """
+    Balance of `account_id` in minor units, now or as of `at`: the latest
+    snapshot taken by then plus the postings after it.
+    """
+    snapshot = select(BalanceSnapshot.posting_id, BalanceSnapshot.balance_minor).where(
+        BalanceSnapshot.account_id == account_id)
+    tail = select(func.coalesce(func.sum(LedgerPosting.amount_minor), 0)).where(
+        LedgerPosting.account_id == account_id)
+    if at is not None:
+        snapshot = snapshot.where(BalanceSnapshot.taken_at <= at)
+        tail = tail.where(LedgerPosting.created_at <= at)
+
+    latest = session.execute(
+        snapshot.order_by(BalanceSnapshot.posting_id.desc()).limit(1)).first()
+    if latest is not None:
+        tail = tail.where(LedgerPosting.id > latest.posting_id)
+    return (latest.balance_minor if latest else 0) + session.scalar(tail)
+
+
+def take_snapshots(session, now=None, settle_seconds=SNAPSHOT_SETTLE_SECONDS):
+    """
+    Snapshot every account with postings since its last snapshot, in one
+    INSERT ... SELECT. Returns the number of snapshots written; the caller
+    commits.
+    """
+    taken_at = (now or datetime.utcnow()) - timedelta(seconds=settle_seconds)
+    high_water = session.scalar(select(func.max(LedgerPosting.id)).where(LedgerPosting.created_at <= taken_at))
+    if high_water is None:
+        return 0
+
+    latest_ids = (
+        select(BalanceSnapshot.account_id, func.max(BalanceSnapshot.posting_id).label('posting_id'))
+        .group_by(BalanceSnapshot.account_id)
+        .subquery()
+    )
+    latest = (
+        select(BalanceSnapshot.account_id, BalanceSnapshot.posting_id, BalanceSnapshot.balance_minor)
+        .join(latest_ids, and_(BalanceSnapshot.account_id == latest_ids.c.account_id,
+                               BalanceSnapshot.posting_id == latest_ids.c.posting_id))
+        .subquery()
+    )
+    tails = (
+        select(
+            LedgerPosting.account_id,
+            literal(taken_at, DateTime),
+            func.max(LedgerPosting.id),
+            func.coalesce(latest.c.balance_minor, 0) + func.sum(LedgerPosting.amount_minor),
+        )
+        .outerjoin(latest, latest.c.account_id == LedgerPosting.account_id)
+        .where(LedgerPosting.account_id.isnot(None),
+               LedgerPosting.id > func.coalesce(latest.c.posting_id, 0),
+               LedgerPosting.id <= high_water)
+        .group_by(LedgerPosting.account_id, latest.c.balance_minor)
+    )
+    return session.execute(
+        insert(BalanceSnapshot).from_select(['account_id', 'taken_at', 'posting_id', 'balance_minor'], tails)
+    ).rowcount
+
+
+def backfill_postings(session, batch_size=5000):
+    """
+    Write the postings of transactions recorded before the ledger existed,
+    `batch_size` transactions per commit. Returns the number of transactions posted.
+    """
+    unposted = (
+        select(Transaction.id, Transaction.account_id, Transaction.sent_account_id,
+               Transaction.transaction_type, Transaction.amount, Transaction.created_at,
+               Transaction.converted_amount)
+        .where(~exists().where(LedgerPosting.transaction_id == Transaction.id))
+        .order_by(Transaction.id)
+        .limit(batch_size)
+    )
+    posted = 0
+    while True:
+        batch = session.execute(unposted).all()
+        record_postings(session, batch)
+        session.commit()
+        posted += len(batch)
+        if len(batch) < batch_size:
+            return posted
+
+
+def backfill_opening_balances(session, batch_size=5000):
+    """
+    Bring the balances of accounts opened before opening balances were
+    recorded into the ledger: the part of each balance that no transaction
+    explains becomes an opening-balance transaction, dated when the account
+    was opened, with its postings. Accounts that already have one are left
+    alone. The owners' data versions are bumped in the same commit, so
+    cached history and dashboards are refetched. Commits every `batch_size`
+    accounts; returns the number of accounts backfilled.
+    """
+    low, high = session.execute(select(func.min(Account.id), func.max(Account.id))).one()
+    if low is None:
+        return 0
+
+    already_opened = exists().where(Transaction.account_id == Account.id,
+                                    Transaction.description == OPENING_BALANCE)
+    opened = 0
+    for first_id in range(low, high + 1, batch_size):
+        unexplained = session.execute(
+            mismatched_balances(first_id, first_id + batch_size - 1)
+            .add_columns(Account.currency, Account.user_id, Account.created_at)
+            .where(~already_opened)
+        ).all()
+        rows = []
+        for account_id, balance, computed, currency, user_id, created_at in unexplained:
+            difference = round(balance - computed, 2)
+            rows.append({
+                "account_id": account_id,
+                "transaction_type": TransactionType.DEPOSIT if difference > 0 else TransactionType.WITHDRAW,
+                "amount": abs(difference),
+                "currency": currency,
+                "user_id": user_id,
+                "description": OPENING_BALANCE,
+                "created_at": created_at,
+            })
+        if rows:
+            table = Transaction.__table__
+            ids = session.execute(
+                insert(table).returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+            record_postings(session, [
+                (transaction_id, row["account_id"], None, row["transaction_type"], row["amount"], row["created_at"])
+                for transaction_id, row in zip(ids, rows)
+            ])
+            bump_data_version(session, [row["user_id"] for row in rows])
+        session.commit()
+        opened += len(rows)
+    return opened
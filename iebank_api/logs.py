@@ -0,0 +1,145 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# -------------- STRUCTURED LOGGING PIPELINE ---------------------------------------
+#
+# Request threads only put records on an in-memory queue; a background
+# QueueListener thread formats them as JSON and writes them to stdout. When
+# the queue is full records are dropped rather than blocking a request.
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+_handler = None
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, including any `extra=` fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records below WARNING for selected loggers.
+    `rates` maps a logger name (or prefix) to the share of records kept.
+    """
+
+    def __init__(self, rates, rng=random.random):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self.rng = rng
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        for name, rate in self.rates:
+            if record.name == name or record.name.startswith(name + "."):
+                return self.rng() < rate
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that counts and drops records when the queue is full.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        # The base class formats the record here and folds the traceback into
+        # `message`. Only resolve the message and render the traceback (its
+        # frames cannot outlive this thread); the listener formats the rest.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_mapping(value, convert=str):
+    """
+    Read "name=value,name=value" (or a dict) into a dict.
+    """
+    if isinstance(value, dict):
+        return {name: convert(item) for name, item in value.items()}
+    mapping = {}
+    for pair in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, _, item = pair.partition("=")
+        mapping[name.strip()] = convert(item.strip())
+    return mapping
+
+
+def configure_logging(app, stream=None):
+    """
+    Route the `iebank_api` loggers through the queue and start the listener.
+    Safe to call more than once; the previous pipeline is replaced.
+    """
+    global _listener, _handler
+
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    _handler = DroppingQueueHandler(queue.Queue(app.config['LOG_QUEUE_SIZE']))
+    _handler.addFilter(SamplingFilter(parse_mapping(app.config['LOG_SAMPLING'], float)))
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+
+    root = logging.getLogger("iebank_api")
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+    for name, level in parse_mapping(app.config['LOG_LEVELS'], str.upper).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener.start()
+    return _handler
+
+
+def stop_logging():
+    """
+    Flush the queue and stop the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,88 @@
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess,
+)
+
+# -------------- PROMETHEUS METRICS -----------------------------------------------
+#
+# Under gunicorn every worker is a separate process. When
+# PROMETHEUS_MULTIPROC_DIR is set (see Dockerfile and gunicorn.conf.py), each
+# worker writes its samples to memory-mapped files in that directory and
+# /metrics aggregates all of them, whichever worker serves the scrape.
+
+REQUEST_LATENCY = Histogram(
+    'iebank_http_request_duration_seconds', 'Request latency by endpoint.',
+    ['method', 'endpoint'],
+)
+REQUEST_COUNT = Counter(
+    'iebank_http_requests_total', 'Requests by endpoint and status code.',
+    ['method', 'endpoint', 'status'],
+)
+IN_FLIGHT = Gauge(
+    'iebank_http_requests_in_flight', 'Requests currently being handled.',
+    multiprocess_mode='livesum',
+)
+POOL_CHECKED_OUT = Gauge(
+    'iebank_db_pool_checked_out', 'Database connections checked out of the pool.',
+    multiprocess_mode='livesum',
+)
+POOL_OVERFLOW = Gauge(
+    'iebank_db_pool_overflow', 'Database connections open beyond the pool size.',
+    multiprocess_mode='livesum',
+)
+TRANSFERS = Counter(
+    'iebank_transfers_total', 'Transfers, deposits and withdrawals by path and outcome.',
+    ['kind', 'outcome'],
+)
+
+
+def _registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def _update_pool_gauges(engine):
+    pool = engine.pool
+    if hasattr(pool, 'checkedout'):
+        POOL_CHECKED_OUT.set(pool.checkedout())
+    if hasattr(pool, 'overflow'):
+        POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+def init_app(app, engine):
+    """
+    Time every request and serve the text exposition format at /metrics.
+    """
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_in_flight = True
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            REQUEST_LATENCY.labels(request.method, endpoint).observe(time.perf_counter() - started)
+            REQUEST_COUNT.labels(request.method, endpoint, str(response.status_code)).inc()
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        if g.pop('metrics_in_flight', False):
+            IN_FLIGHT.dec()
+        _update_pool_gauges(engine)
+
+    def metrics():
+        _update_pool_gauges(engine)
+        return Response(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -1,9 +1,10 @@
 from iebank_api import db
 from datetime import datetime, timezone
-import string
-import random
+from sqlalchemy import DDL, event
 import enum
 from flask_login import UserMixin
+from iebank_api.account_numbers import account_number_allocator
+from iebank_api.cache import user_cache
 
 # -------------- USER REGISTRATION & LOGIN ------------------
 
@@ -18,7 +19,17 @@ class User(db.Model, UserMixin):
     created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     admin = db.Column(db.Boolean, nullable=False, default=False)
     status = db.Column(db.String(10), nullable=False, default="Active")
+    # Bumped whenever this user's accounts, transactions or profile change; drives dashboard ETags
+    data_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
+    # Prefix search in the admin console; Postgres needs pattern ops for LIKE 'abc%'
+    __table_args__ = (
+        db.Index('ix_user_username_prefix', 'username',
+                 postgresql_ops={'username': 'text_pattern_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_user_email_prefix', 'email',
+                 postgresql_ops={'email': 'text_pattern_ops'}).ddl_if(dialect='postgresql'),
+    )
+
     # Relationship with Account
     accounts = db.relationship('Account', backref='user', lazy=True)
     # Relationship with Transaction 
@@ -39,12 +50,26 @@ class User(db.Model, UserMixin):
         Deactivates the user account by setting the status to 'Inactive'.
         """
         self.status = "Inactive"
+        user_cache.invalidate(self.id)
         return self.status
 
     def get_id(self):
         return str(self.id)  # Ensure ID is returned as a string
 
 
+def bump_data_version(session, user_ids):
+    """
+    Mark the data of `user_ids` as changed. Call it inside the transaction
+    that makes the change, so the new version commits (or rolls back) with it.
+    """
+    session.execute(
+        db.update(User)
+        .where(User.id.in_(sorted(set(user_ids))))
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
 # -------------- BANK ACCOUNT SYSTEM---------------------------------------
 
 class Account(db.Model):
@@ -52,13 +77,13 @@ class Account(db.Model):
     name = db.Column(db.String(32), nullable=False)
     account_number = db.Column(db.String(20), nullable=False, unique=True)
     balance = db.Column(db.Float, nullable=False, default=0.0)
-    currency = db.Column(db.String(3), nullable=False, default="€")
+    currency = db.Column(db.String(3), nullable=False, default="EUR")
     country = db.Column(db.String(32), nullable=False)
     status = db.Column(db.String(10), nullable=False, default="Active")
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     # Foreign key to User
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
 
     def __repr__(self):
         return f'<Account {self.account_number}>'
@@ -69,7 +94,6 @@ class Account(db.Model):
     
     def __init__(self, name, currency, country, user_id, balance=0.0):
         self.name = name
-        self.account_number = ''.join(random.choices(string.digits, k=20))
         self.currency = currency
         self.country = country
         self.balance = balance
@@ -77,6 +101,14 @@ class Account(db.Model):
         self.user_id = user_id
 
 
+# Numbers come from the counter on the connection that inserts the account,
+# so any session can create accounts, with or without an app context
+@event.listens_for(Account, 'before_insert')
+def _allocate_account_number(mapper, connection, target):
+    if target.account_number is None:
+        target.account_number = account_number_allocator.allocate(connection)
+
+
 class TransactionType(enum.Enum):
     DEPOSIT = 'deposit'
     WITHDRAW = 'withdraw'
@@ -95,9 +127,22 @@ class Transaction(db.Model):
     sent_account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)
     transaction_type = db.Column(db.Enum(TransactionType), nullable=False)
     amount = db.Column(db.Float, nullable=False)
-    currency = db.Column(db.String(3), nullable=False, default="€")
+    currency = db.Column(db.String(3), nullable=False, default="EUR")
     description = db.Column(db.String(100), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Transfers: rate applied from `currency` to the destination's currency, and the amount credited
+    # there; NULL on deposits, withdrawals and transfers recorded before conversion existed
+    fx_rate = db.Column(db.Float, nullable=True)
+    converted_amount = db.Column(db.Float, nullable=True)
+
+    # Composite indexes so a history page is a range scan, not a sort over all rows;
+    # description substring search uses a trigram index (FTS5 on SQLite, see below)
+    __table_args__ = (
+        db.Index('ix_transaction_account_created', 'account_id', 'created_at', 'id'),
+        db.Index('ix_transaction_sent_account_created', 'sent_account_id', 'created_at', 'id'),
+        db.Index('ix_transaction_description_trgm', 'description', postgresql_using='gin',
+                 postgresql_ops={'description': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
 
     # Define relationships
     account = db.relationship('Account', foreign_keys=[account_id], backref='transactions')
@@ -114,3 +159,152 @@ class Transaction(db.Model):
         self.sent_account_id = sent_account_id
         self.description = description
         self.user_id = user_id
+
+
+# Postgres: the trigram operator class comes from the pg_trgm extension
+event.listen(Transaction.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# SQLite: an external-content FTS5 table with the trigram tokenizer, kept in
+# sync with "transaction" by triggers. Dropped with the table so it never
+# indexes stale rowids.
+TRANSACTION_FTS_TABLE = 'transaction_fts'
+TRANSACTION_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TRANSACTION_FTS_TABLE} USING fts5("
+    "description, content='transaction', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {TRANSACTION_FTS_TABLE}_insert AFTER INSERT ON \"transaction\" BEGIN "
+    f"INSERT INTO {TRANSACTION_FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TRANSACTION_FTS_TABLE}_delete AFTER DELETE ON \"transaction\" BEGIN "
+    f"INSERT INTO {TRANSACTION_FTS_TABLE}({TRANSACTION_FTS_TABLE}, rowid, description) "
+    "VALUES ('delete', old.id, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TRANSACTION_FTS_TABLE}_update AFTER UPDATE OF description ON \"transaction\" "
+    f"BEGIN INSERT INTO {TRANSACTION_FTS_TABLE}({TRANSACTION_FTS_TABLE}, rowid, description) "
+    "VALUES ('delete', old.id, old.description); "
+    f"INSERT INTO {TRANSACTION_FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+)
+for statement in TRANSACTION_FTS_DDL:
+    event.listen(Transaction.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Transaction.__table__, 'before_drop',
+             DDL(f'DROP TABLE IF EXISTS {TRANSACTION_FTS_TABLE}').execute_if(dialect='sqlite'))
+
+
+# -------------- DOUBLE-ENTRY LEDGER ---------------------------------------
+
+class LedgerPosting(db.Model):
+    """
+    One leg of a `Transaction`, in integer minor units (cents): negative
+    for the account the money leaves, positive for the one it reaches. The
+    legs of a transaction sum to zero; `account_id` is NULL for the world
+    outside the bank (cash deposits and withdrawals). Rows are only ever
+    inserted.
+    """
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=False, index=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=True)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    # Snapshot tails are "postings of this account after posting N"
+    __table_args__ = (
+        db.Index('ix_ledger_posting_account_id', 'account_id', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<LedgerPosting {self.id}: {self.amount_minor} on Account {self.account_id}>'
+
+
+class BalanceSnapshot(db.Model):
+    """
+    Balance of an account, in minor units, including every posting up to
+    `posting_id`. Balances are a snapshot plus the postings after it.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    posting_id = db.Column(db.BigInteger, nullable=False)
+    balance_minor = db.Column(db.BigInteger, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_balance_snapshot_account_taken', 'account_id', 'taken_at'),
+    )
+
+    def __repr__(self):
+        return f'<BalanceSnapshot {self.account_id} at {self.taken_at}: {self.balance_minor}>'
+
+
+# -------------- ACCOUNT ROLLUPS ------------------------------------------
+
+class AccountRollup(db.Model):
+    """
+    Inflow, outflow, transaction count and closing balance of one account
+    over one day or month. Maintained by iebank_api.rollups.
+    """
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id', ondelete='CASCADE'), primary_key=True)
+    granularity = db.Column(db.String(5), primary_key=True)  # 'day' or 'month'
+    period_start = db.Column(db.Date, primary_key=True)
+    inflow = db.Column(db.Float, nullable=False, default=0.0)
+    outflow = db.Column(db.Float, nullable=False, default=0.0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    closing_balance = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<AccountRollup {self.account_id} {self.granularity} {self.period_start}>'
+
+
+# -------------- IDEMPOTENT REQUESTS ---------------------------------------
+
+class IdempotencyKey(db.Model):
+    """
+    Response stored for a client-supplied Idempotency-Key, written in the
+    same transaction as the transfer it belongs to.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # SHA-256 of the request body
+    status_code = db.Column(db.Integer, nullable=False)
+    response_body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user_key'),
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.user_id}:{self.key}>'
+
+
+# -------------- RECONCILIATION -------------------------------------------
+
+class ReconciliationMismatch(db.Model):
+    """
+    An account whose stored balance differed from the sum of its
+    transactions when `flask reconcile` checked it. Rows of one run share
+    `run_id`; `account_id` is not a foreign key so reports outlive accounts.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(32), nullable=False, index=True)
+    account_id = db.Column(db.Integer, nullable=False)
+    recorded_balance = db.Column(db.Float, nullable=False)
+    computed_balance = db.Column(db.Float, nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReconciliationMismatch {self.run_id} Account {self.account_id}>'
+
+
+# -------------- FOREIGN EXCHANGE -----------------------------------------
+
+class FxRate(db.Model):
+    """
+    Units of `quote_currency` per unit of `base_currency`. Loaded from a
+    file by `flask fx load` and served to transfers from iebank_api.fx.
+    """
+    base_currency = db.Column(db.String(3), primary_key=True)
+    quote_currency = db.Column(db.String(3), primary_key=True)
+    rate = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<FxRate {self.base_currency}/{self.quote_currency} {self.rate}>'
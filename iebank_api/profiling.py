@@ -0,0 +1,141 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# -------------- PER-REQUEST SQL PROFILER ----------------------------------------
+
+logger = logging.getLogger(__name__)
+
+# Bind-parameter lists such as "IN (?, ?, ?)" collapse to one placeholder so that
+# the same statement with different list lengths counts as one shape.
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    """
+    Normalise a SQL statement so repeated executions compare equal.
+    """
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """
+    Queries executed while handling one request (or inside a `query_budget`).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.statements = []
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+        self.statements.append(statement)
+
+    def repeated(self, threshold):
+        """
+        Statement shapes executed at least `threshold` times: likely N+1 loops.
+        """
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+
+def _time_cursor(engine, on_query):
+    """
+    Call `on_query(statement, seconds)` for every statement run on `engine`.
+    Returns the listeners so they can be removed again.
+    """
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        on_query(statement, time.perf_counter() - started)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    return before_cursor_execute, after_cursor_execute
+
+
+class SQLProfiler:
+    """
+    Counts and times the SQL each Flask request runs on the app's engine.
+
+    Every response gets a `Server-Timing: db;dur=...` header and a structured
+    log record. Statement shapes repeated `n_plus_one_threshold` times or more
+    in one request are logged as a likely N+1 pattern.
+    """
+
+    def __init__(self, n_plus_one_threshold=5):
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    def init_app(self, app, engine):
+        self.n_plus_one_threshold = app.config.get('SQL_PROFILER_N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        _time_cursor(engine, self._record)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.sql_stats = QueryStats()
+
+    def _record(self, statement, seconds):
+        if has_request_context():
+            stats = g.get("sql_stats")
+            if stats is not None:
+                stats.record(statement, seconds)
+
+    def _finish(self, response):
+        stats = g.pop("sql_stats", None)
+        if stats is None:
+            return response
+
+        db_ms = stats.seconds * 1000
+        response.headers.add("Server-Timing", f'db;dur={db_ms:.2f};desc="{stats.count} queries"')
+
+        repeated = stats.repeated(self.n_plus_one_threshold)
+        for shape, count in repeated.items():
+            logger.warning("Possible N+1 query in %s: %d x %s", request.endpoint, count, shape)
+
+        logger.info("sql profile", extra={
+            "endpoint": request.endpoint,
+            "method": request.method,
+            "status": response.status_code,
+            "queries": stats.count,
+            "db_ms": round(db_ms, 2),
+            "repeated_shapes": len(repeated),
+        })
+        return response
+
+
+@contextmanager
+def query_budget(engine, max_queries):
+    """
+    Fail with an AssertionError if the block runs more than `max_queries`
+    statements on `engine`. Yields the collected `QueryStats`.
+
+        with query_budget(db.engine, 3):
+            client.get("/admin/users")
+    """
+    stats = QueryStats()
+    listeners = _time_cursor(engine, stats.record)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, "before_cursor_execute", listeners[0])
+        event.remove(engine, "after_cursor_execute", listeners[1])
+
+    if stats.count > max_queries:
+        raise AssertionError(
+            f"Expected at most {max_queries} queries, got {stats.count}:\n" + "\n".join(stats.statements)
+        )
+
+
+sql_profiler = SQLProfiler()
@@ -0,0 +1,133 @@
+import atexit
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import case, create_engine, func, insert, literal, select, union_all
+
+from iebank_api.database import init_token_auth
+from iebank_api.models import Account, ReconciliationMismatch, Transaction, TransactionType
+
+# -------------- BALANCE RECONCILIATION -------------------------------------------
+#
+# Every Account.balance is checked against the sum of its transactions, one
+# account-id range per task. The database aggregates each range in a single
+# GROUP BY and returns only the accounts that disagree, which are streamed
+# into the report table. Ranges run in worker processes, each holding one
+# connection of its own for its whole life.
+
+# Balances are floats; differences below half a cent are rounding noise
+TOLERANCE = 0.005
+
+# App settings a worker needs to connect the way the app does: pool and
+# driver options, and the access token presented as the password
+WORKER_CONFIG_KEYS = ('SQLALCHEMY_ENGINE_OPTIONS', 'DB_CREDENTIAL_PROVIDER', 'DB_TOKEN_SCOPE',
+                      'DB_TOKEN_REFRESH_MARGIN')
+
+_connection = None
+
+
+def mismatched_balances(first_id, last_id, tolerance=TOLERANCE):
+    """
+    Query for (account id, recorded balance, computed balance) of the
+    accounts in `first_id`..`last_id` whose balance disagrees with their
+    transactions by more than `tolerance`.
+    """
+    in_range = Transaction.account_id.between(first_id, last_id)
+    movements = union_all(
+        # Money leaving or (for deposits) entering the account that owns the row
+        select(
+            Transaction.account_id.label('account_id'),
+            case((Transaction.transaction_type == TransactionType.DEPOSIT, Transaction.amount),
+                 else_=-Transaction.amount).label('delta'),
+        ).where(in_range),
+        # Money arriving from a transfer, in the receiving account's currency
+        select(Transaction.sent_account_id, func.coalesce(Transaction.converted_amount, Transaction.amount))
+        .where(Transaction.sent_account_id.between(first_id, last_id)),
+    ).subquery()
+    totals = (
+        select(movements.c.account_id, func.sum(movements.c.delta).label('total'))
+        .group_by(movements.c.account_id)
+        .subquery()
+    )
+    computed = func.coalesce(totals.c.total, literal(0.0))
+    return (
+        select(Account.id, Account.balance, computed)
+        .outerjoin(totals, totals.c.account_id == Account.id)
+        .where(Account.id.between(first_id, last_id), func.abs(Account.balance - computed) > tolerance)
+        .order_by(Account.id)
+    )
+
+
+def reconcile_chunk(connection, run_id, first_id, last_id, tolerance=TOLERANCE, batch_size=1000):
+    """
+    Check accounts `first_id`..`last_id` on `connection` and write a
+    ReconciliationMismatch row for each disagreeing balance, `batch_size`
+    rows per INSERT. Returns (accounts checked, mismatches).
+    """
+    checked = connection.scalar(select(func.count(Account.id)).where(Account.id.between(first_id, last_id)))
+    result = connection.execution_options(yield_per=batch_size).execute(
+        mismatched_balances(first_id, last_id, tolerance))
+    found = 0
+    for partition in result.partitions():
+        connection.execute(insert(ReconciliationMismatch.__table__), [
+            {"run_id": run_id, "account_id": account_id, "recorded_balance": balance,
+             "computed_balance": computed}
+            for account_id, balance, computed in partition
+        ])
+        found += len(partition)
+    connection.commit()
+    return checked, found
+
+
+def _init_worker(url, config):
+    global _connection
+    engine = create_engine(url, **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    init_token_auth(config, engine)
+    _connection = engine.connect()
+    atexit.register(_connection.close)
+
+
+def _run_chunk(chunk):
+    return reconcile_chunk(_connection, *chunk)
+
+
+def _in_memory(engine):
+    return engine.dialect.name == 'sqlite' and engine.url.database in (None, '', ':memory:')
+
+
+def reconcile(engine, workers=None, chunk_size=5000, tolerance=TOLERANCE, config=None):
+    """
+    Reconcile every account, `chunk_size` accounts per task, on `workers`
+    processes (default: one per CPU). Worker processes open their
+    connection with the engine options and token authentication of the
+    app `config`. Returns (run_id, accounts checked, mismatches).
+    """
+    run_id = uuid.uuid4().hex
+    with engine.connect() as connection:
+        low, high = connection.execute(select(func.min(Account.id), func.max(Account.id))).one()
+    if low is None:
+        return run_id, 0, 0
+
+    chunks = [(run_id, start, min(start + chunk_size - 1, high), tolerance)
+              for start in range(low, high + 1, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    # An in-memory SQLite database is private to this process
+    if workers == 1 or _in_memory(engine):
+        with engine.connect() as connection:
+            results = [reconcile_chunk(connection, *chunk) for chunk in chunks]
+    else:
+        # Spawned workers build their own engine instead of inheriting this
+        # process's pooled connections across fork
+        config = config or {}
+        worker_config = {key: config[key] for key in WORKER_CONFIG_KEYS if key in config}
+        with ProcessPoolExecutor(
+                max_workers=min(workers, len(chunks)),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(engine.url.render_as_string(hide_password=False), worker_config)) as pool:
+            results = list(pool.map(_run_chunk, chunks))
+
+    return run_id, sum(checked for checked, _ in results), sum(found for _, found in results)
@@ -0,0 +1,146 @@
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, text
+
+# -------------- READ REPLICA ROUTING ---------------------------------------------
+#
+# Replicas are extra Flask-SQLAlchemy binds named replica_0, replica_1, ...
+# (DB_REPLICA_URIS). Views decorated with `replica_reads` send their SELECTs
+# to one replica per request, round-robin. Everything else uses the primary,
+# and so does everything a client sends within REPLICA_READ_YOUR_WRITES_SECONDS
+# of its last write, so a dashboard polled right after a transfer already
+# shows it.
+
+REPLICA_BIND_PREFIX = 'replica_'
+_PRIMARY_UNTIL = '_db_primary_until'
+
+# Seconds the replica is behind its primary; dialects without a probe report no lag
+LAG_QUERIES = {
+    'postgresql': (
+        "SELECT CASE WHEN pg_is_in_recovery() "
+        "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END"
+    ),
+}
+
+
+def replica_binds(uris):
+    """
+    `SQLALCHEMY_BINDS` entries for a list of replica URIs.
+    """
+    return {f"{REPLICA_BIND_PREFIX}{index}": uri for index, uri in enumerate(uris)}
+
+
+def _is_write(clause):
+    # Only plain SELECTs may go to a replica; DML, SELECT ... FOR UPDATE, raw SQL
+    # and anything else we cannot inspect stay on the primary
+    if isinstance(clause, Select):
+        return clause._for_update_arg is not None
+    return True
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that sends reads to the request's replica, if
+    one was chosen, and flushes and DML to the primary. Any write marks the
+    request so the client reads from the primary for a while afterwards.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or _is_write(clause):
+                g.db_wrote = True
+            else:
+                replica = g.get('db_replica')
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaSet:
+    """
+    The replica engines of one app, handed out round-robin. Replicas whose
+    measured lag exceeds `max_lag` seconds, or whose probe fails, are skipped.
+    """
+
+    def __init__(self, engines, max_lag=None, lag_check_interval=1.0, clock=time.monotonic):
+        self.engines = list(engines)
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.clock = clock
+        self._cycle = itertools.cycle(self.engines)
+        self._lags = {}
+        self._lock = threading.Lock()
+
+    def lag(self, engine):
+        """
+        Cached replication lag in seconds, None if unknown. Raises if the
+        replica cannot be reached.
+        """
+        query = LAG_QUERIES.get(engine.dialect.name)
+        if query is None:
+            return None
+        checked, lag = self._lags.get(engine, (None, None))
+        if checked is None or self.clock() - checked >= self.lag_check_interval:
+            with engine.connect() as connection:
+                lag = float(connection.scalar(text(query)))
+            self._lags[engine] = (self.clock(), lag)
+        return lag
+
+    def choose(self):
+        """
+        Next usable replica and its lag, or (None, None) to use the primary.
+        """
+        for _ in range(len(self.engines)):
+            with self._lock:
+                engine = next(self._cycle)
+            try:
+                lag = self.lag(engine)
+            except Exception:
+                continue
+            if self.max_lag is None or lag is None or lag <= self.max_lag:
+                return engine, lag
+        return None, None
+
+
+def replica_reads(f):
+    """
+    Serve a GET view from a replica unless the client wrote recently.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        replicas = current_app.extensions.get('replicas')
+        if replicas and request.method == 'GET' and session.get(_PRIMARY_UNTIL, 0) <= time.time():
+            g.db_replica, g.db_replica_lag = replicas.choose()
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def init_app(app, engines):
+    """
+    Register the replica engines and the hooks that report the route taken
+    and open read-your-writes windows.
+    """
+    app.extensions['replicas'] = ReplicaSet(
+        engines,
+        max_lag=app.config['REPLICA_MAX_LAG'],
+        lag_check_interval=app.config['REPLICA_LAG_CHECK_INTERVAL'],
+    )
+    window = app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+
+    @app.after_request
+    def route_headers(response):
+        if g.get('db_wrote') and response.status_code < 400:
+            session[_PRIMARY_UNTIL] = time.time() + window
+        if g.get('db_replica') is not None:
+            response.headers['X-DB-Route'] = 'replica'
+            lag = g.get('db_replica_lag')
+            if lag is not None:
+                response.headers['X-Replica-Lag'] = f"{lag:.3f}"
+        else:
+            response.headers['X-DB-Route'] = 'primary'
+        return response
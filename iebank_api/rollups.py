@@ -0,0 +1,198 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from iebank_api.models import Account, AccountRollup, Transaction, TransactionType
+
+# -------------- PER-ACCOUNT ROLLUPS -----------------------------------------------
+#
+# Every money movement upserts the day and month rows of the accounts it
+# touches, in the same database transaction, so a summary reads one row per
+# period instead of every transaction. `rebuild_rollups` recomputes them
+# from the ledger.
+
+GRANULARITIES = ('day', 'month')
+
+
+def period_start(at, granularity):
+    """
+    First day of the `granularity` period containing `at` (a date or datetime).
+    """
+    day = at.date() if isinstance(at, datetime) else at
+    return day if granularity == 'day' else date(day.year, day.month, 1)
+
+
+def _upsert_statement(dialect_name):
+    dialect = {'postgresql': postgresql, 'sqlite': sqlite}.get(dialect_name)
+    if dialect is None:
+        raise RuntimeError(f"Rollups need PostgreSQL or SQLite, not {dialect_name}.")
+    table = AccountRollup.__table__
+    statement = dialect.insert(table)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.account_id, table.c.granularity, table.c.period_start],
+        set_={
+            "inflow": table.c.inflow + excluded.inflow,
+            "outflow": table.c.outflow + excluded.outflow,
+            "transaction_count": table.c.transaction_count + excluded.transaction_count,
+            "closing_balance": excluded.closing_balance,
+        },
+    )
+
+
+def record_activity(session, activity, at):
+    """
+    Add money movements to the rollups of the period containing `at`.
+
+    `activity` maps account_id to `(inflow, outflow, count, balance)`, where
+    `balance` is the account balance after the movements. Call it inside the
+    transaction that moved the money, after the account rows were updated:
+    their row locks keep the closing balances of concurrent writers in order.
+    """
+    rows = [
+        {
+            "account_id": account_id,
+            "granularity": granularity,
+            "period_start": period_start(at, granularity),
+            "inflow": inflow,
+            "outflow": outflow,
+            "transaction_count": count,
+            "closing_balance": balance,
+        }
+        for account_id, (inflow, outflow, count, balance) in sorted(activity.items())
+        for granularity in GRANULARITIES
+    ]
+    if rows:
+        session.execute(_upsert_statement(session.get_bind().dialect.name), rows)
+
+
+def account_summary(session, account_id, granularity, start=None, end=None):
+    """
+    Rollup rows of one account, oldest period first, optionally limited to
+    periods starting in [start, end].
+    """
+    query = (
+        select(AccountRollup.period_start, AccountRollup.inflow, AccountRollup.outflow,
+               AccountRollup.transaction_count, AccountRollup.closing_balance)
+        .where(AccountRollup.account_id == account_id, AccountRollup.granularity == granularity)
+        .order_by(AccountRollup.period_start)
+    )
+    if start:
+        query = query.where(AccountRollup.period_start >= period_start(start, granularity))
+    if end:
+        query = query.where(AccountRollup.period_start <= end)
+    return [
+        {
+            "period": period.isoformat(),
+            "inflow": round(inflow, 2),
+            "outflow": round(outflow, 2),
+            "count": count,
+            "closing_balance": round(closing_balance, 2),
+        }
+        for period, inflow, outflow, count, closing_balance in session.execute(query)
+    ]
+
+
+# -------------- REBUILD --------------------------------------------------------
+
+
+def _rollup_rows(daily, balances):
+    """
+    Turn per-day totals into day and month rows. Closing balances are
+    walked back from each account's current balance, newest period first.
+    """
+    periods = defaultdict(lambda: [0.0, 0.0, 0])
+    for (account_id, day), (inflow, outflow, count) in daily.items():
+        for granularity in GRANULARITIES:
+            entry = periods[account_id, granularity, period_start(day, granularity)]
+            entry[0] += inflow
+            entry[1] += outflow
+            entry[2] += count
+
+    rows = []
+    running = {}
+    for (account_id, granularity, start), (inflow, outflow, count) in sorted(periods.items(), reverse=True):
+        if account_id not in balances:
+            continue
+        closing = running.get((account_id, granularity), balances[account_id])
+        running[account_id, granularity] = closing - (inflow - outflow)
+        rows.append({
+            "account_id": account_id,
+            "granularity": granularity,
+            "period_start": start,
+            "inflow": round(inflow, 2),
+            "outflow": round(outflow, 2),
+            "transaction_count": count,
+            "closing_balance": round(closing, 2),
+        })
+    return rows
+
+
+def rebuild_chunk(engine, first_id, last_id, batch_size=5000):
+    """
+    Recompute the rollups of accounts `first_id`..`last_id` in one
+    transaction. The account rows are locked first, so transfers touching
+    them wait instead of racing the rebuild. Returns the rows written.
+    """
+    with Session(engine) as session, session.begin():
+        balances = dict(session.execute(
+            select(Account.id, Account.balance)
+            .where(Account.id.between(first_id, last_id))
+            .order_by(Account.id)
+            .with_for_update()
+        ).all())
+
+        daily = defaultdict(lambda: [0.0, 0.0, 0])
+        outgoing = (
+            select(Transaction.account_id, Transaction.transaction_type, Transaction.amount, Transaction.created_at)
+            .where(Transaction.account_id.between(first_id, last_id))
+            .execution_options(yield_per=batch_size)
+        )
+        for account_id, transaction_type, amount, created_at in session.execute(outgoing):
+            entry = daily[account_id, created_at.date()]
+            entry[0 if transaction_type == TransactionType.DEPOSIT else 1] += amount
+            entry[2] += 1
+
+        incoming = (
+            select(Transaction.sent_account_id, func.coalesce(Transaction.converted_amount, Transaction.amount),
+                   Transaction.created_at)
+            .where(Transaction.sent_account_id.between(first_id, last_id))
+            .execution_options(yield_per=batch_size)
+        )
+        for account_id, amount, created_at in session.execute(incoming):
+            entry = daily[account_id, created_at.date()]
+            entry[0] += amount
+            entry[2] += 1
+
+        rows = _rollup_rows(daily, balances)
+        session.execute(delete(AccountRollup).where(AccountRollup.account_id.between(first_id, last_id)))
+        for start in range(0, len(rows), batch_size):
+            session.execute(insert(AccountRollup.__table__), rows[start:start + batch_size])
+    return len(rows)
+
+
+def rebuild_rollups(engine, workers=4, chunk_size=1000):
+    """
+    Recompute every account's rollups from the ledger, `chunk_size`
+    accounts per transaction, `workers` chunks at a time. Returns the number
+    of rollup rows written.
+    """
+    with engine.begin() as connection:
+        low, high = connection.execute(select(func.min(Account.id), func.max(Account.id))).one()
+        # Rollups of accounts that no longer exist
+        connection.execute(delete(AccountRollup).where(
+            or_(AccountRollup.account_id < (low or 0), AccountRollup.account_id > (high or 0))))
+    if low is None:
+        return 0
+
+    # SQLite has a single writer, so parallel chunks would only queue on its lock
+    if engine.dialect.name == 'sqlite':
+        workers = 1
+
+    chunks = [(start, min(start + chunk_size - 1, high)) for start in range(low, high + 1, chunk_size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(lambda chunk: rebuild_chunk(engine, *chunk), chunks))
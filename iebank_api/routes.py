@@ -1,30 +1,44 @@
-from flask import Flask, request, jsonify, abort, render_template, redirect, url_for, flash
-from flask_login import login_user, logout_user, login_required, current_user, LoginManager
-from iebank_api import db, app
-from iebank_api.models import User, Account, Transaction, TransactionType
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, Response, g, request, jsonify, abort, render_template, redirect, url_for, flash, stream_with_context, make_response
+from flask_login import login_user, logout_user, login_required, current_user
+from iebank_api import db
+from iebank_api.models import User, Account, TransactionType, bump_data_version
+from iebank_api.history import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, parse_page_args, parse_filter_args, transactions_page, serialize_transactions,
+    stream_transactions, render_export, EXPORT_MIMETYPES,
+)
+from iebank_api.auth import invalidate_user
+from iebank_api.cache import user_cache
+from iebank_api.hashing import password_hasher, HashingBusy
+from iebank_api.idempotency import idempotency_store, request_fingerprint, MAX_KEY_LENGTH
+from iebank_api.encoding import dumps
+from iebank_api.rollups import GRANULARITIES, account_summary
+from iebank_api.fx import normalize_currency
+from iebank_api.ledger import MAX_AMOUNT, balance_minor, from_minor
+from iebank_api.replicas import replica_reads
+from iebank_api.metrics import TRANSFERS
+from iebank_api.transfers import (
+    transfer_funds, transfer_batch, move_cash, record_opening_balance, TransferError, MAX_BATCH_SIZE,
+)
+from datetime import date, datetime
 from functools import wraps
-from sqlalchemy.exc import SQLAlchemyError
+import hashlib
+import logging
+import math
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import selectinload
 
 
 # -------------- BANK ACCOUNT SYSTEM---------------------------------------
 
-
-# -------------- Login Manager --------------------------------------------
-
-
-# Initialize the login manager
-login_manager = LoginManager()
-login_manager.init_app(app)
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+# All endpoints live on this blueprint; create_app() registers it
+api = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
 
 # -------------- Home Route - index.html ----------------------------------
 
 # Home route
-@app.route('/')
+@api.route('/')
 def home():
     return render_template('index.html')
 
@@ -37,10 +51,34 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Answer If-None-Match with 304 while the user's data_version is unchanged,
+# with a single primary-key lookup instead of the view's queries. The same
+# lookup leaves the user's current name and role in g.etag_user, so views
+# render what the ETag covers rather than this process's cached identity.
+def etag_by_data_version(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.etag_user = db.session.execute(
+            db.select(User.data_version, User.username, User.admin).where(User.id == current_user.id)).one()
+        version = g.etag_user.data_version
+        query = hashlib.blake2b(request.query_string, digest_size=8).hexdigest()
+        etag = f"{current_user.id}-{version}-{query}"
+
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return decorated_function
+
 # -------------- Route for Users ----------------------------------
 
 # Route for user registration
-@app.route('/register', methods=['POST'])
+@api.route('/register', methods=['POST'])
 def register():
     try:
         # Parse JSON data from the request
@@ -55,6 +93,9 @@ def register():
         if not username or not email or not password or not confirm_password:
             return jsonify({"error": "All fields are required."}), 400
 
+        if not math.isfinite(initial_balance) or abs(initial_balance) > MAX_AMOUNT:
+            return jsonify({"error": "Invalid initial balance."}), 400
+
         if User.query.filter_by(email=email).first():
             return jsonify({"error": "An account with this email already exists. Please use a different email or log in."}), 400
 
@@ -62,7 +103,7 @@ def register():
             return jsonify({"error": "Passwords do not match."}), 400
 
         # Create and save the new user
-        hashed_password = generate_password_hash(password)
+        hashed_password = password_hasher.hash(password)
         new_user = User(username=username, email=email, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -70,19 +111,21 @@ def register():
         # Create a new default account for the user
         new_account = Account(name="Default Account", currency="EUR", country="Spain", user_id=new_user.id, balance=initial_balance)
         db.session.add(new_account)
+        db.session.flush()
+        record_opening_balance(db.session, new_account.id, new_user.id, initial_balance, new_account.currency)
         db.session.commit()
 
         return jsonify({"message": "Registration successful! Please log in."}), 201
 
-    except SQLAlchemyError as e:
+    except SQLAlchemyError:
         db.session.rollback()
-        print("Error during registration:", e)  # Debugging line
+        logger.exception("Error during registration")
         return jsonify({"error": "An error occurred while registering. Please try again."}), 500
     
 
 # Route for user 
 
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
     try:
         # Parse JSON data from the request
@@ -93,10 +136,14 @@ def login():
         # Check if the user exists
         user = User.query.filter_by(username=username).first()
 
-        if user and check_password_hash(user.password, password):
+        if user and password_hasher.verify(user.password, password):
+            # Upgrade hashes made with an older method or cost while we have the plain password
+            if password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.hash(password)
+                db.session.commit()
+
             login_user(user)
-            print("Is Authenticated after login:", current_user.is_authenticated)
-            print("Current User ID after login:", current_user.get_id() if current_user.is_authenticated else "None")
+            logger.debug("User logged in", extra={"user_id": user.id})
 
             # Return JSON response for the frontend
             if user.admin:
@@ -105,27 +152,27 @@ def login():
                 return jsonify({"message": "Login successful", "redirect": "dashboard"}), 200
         else:
             return jsonify({"error": "Invalid username or password"}), 401
-    except Exception as e:
-        print(f"Login Error: {e}")
+    except HashingBusy:
+        raise
+    except Exception:
+        logger.exception("Error during login")
         return jsonify({"error": "An error occurred during login"}), 500
 
 # Route for user logout
-@app.route('/logout')
+@api.route('/logout')
 @login_required
 def logout():
-    print("Logout route accessed.")  # Debug print
-    print(f"Current user: {current_user}")  # Check who is logging out
+    logger.debug("User logging out", extra={"user_id": current_user.id})
     try:
         logout_user()
-        print("User logged out successfully.")  # Confirm user logout
         flash('You have been logged out.', 'info')
         return jsonify({"message": "Logout successful"}), 200
-    except Exception as e:
-        print(f"Error during logout: {e}")  # Print any errors
+    except Exception:
+        logger.exception("Error during logout")
         return jsonify({"error": "Logout failed"}), 500
 
 # Route for creating a new accounts
-@app.route('/create_account', methods=['POST'])
+@api.route('/create_account', methods=['POST'])
 @login_required
 def create_account():
     try:
@@ -135,11 +182,18 @@ def create_account():
         country = data.get('country')
         initial_balance = float(data.get('initial_balance'))  # Default to 0.0
 
-        print(account_name, currency, country, initial_balance)  # Debugging line
         if not account_name or not currency or not country or not initial_balance:
             return jsonify({"error": "All fields are required"}), 400
 
-        # Ensure initial_balance is valid
+        # Stored upper case, so "eur" and "EUR" accounts never need a conversion
+        try:
+            currency = normalize_currency(currency)
+        except ValueError:
+            return jsonify({"error": "Currency must be a 3-letter code"}), 400
+
+        # Ensure initial_balance is valid; float() also accepts "nan" and "inf"
+        if not math.isfinite(initial_balance) or initial_balance > MAX_AMOUNT:
+            return jsonify({"error": "Invalid initial balance"}), 400
         if initial_balance < 0:
             return jsonify({"error": "Initial balance cannot be negative"}), 400
 
@@ -152,25 +206,36 @@ def create_account():
             balance=initial_balance
         )
         db.session.add(new_account)
+        db.session.flush()
+        record_opening_balance(db.session, new_account.id, current_user.id, initial_balance, currency)
+        bump_data_version(db.session, [current_user.id])
         db.session.commit()
 
         return jsonify({"message": "New account created successfully."}), 201
     except ValueError:
         return jsonify({"error": "Invalid initial balance"}), 400
-    except SQLAlchemyError as e:
+    except SQLAlchemyError:
         db.session.rollback()
-        print(f"Error creating account: {e}")
+        logger.exception("Error creating account")
         return jsonify({"error": "An error occurred while creating the account."}), 500
 
 
 # Route for user dashboard
-@app.route('/dashboard', methods=['GET'])
+@api.route('/dashboard', methods=['GET'])
 @login_required
+@replica_reads
+@etag_by_data_version
 def dashboard():
     try:
-        if current_user.admin:  # Check if the user is an admin
+        cursor, limit = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    user = g.etag_user
+    try:
+        if user.admin:  # Check if the user is an admin
             return jsonify({
-                "username": current_user.username,
+                "username": user.username,
                 "is_admin": True,
                 "accounts": [],
                 "transactions": [],
@@ -179,23 +244,19 @@ def dashboard():
 
         # Fetch accounts for the current user
         user_accounts = Account.query.filter_by(user_id=current_user.id).all()
-        print(f"User ID: {current_user.id}, User Accounts: {user_accounts}")
 
         if not user_accounts:
             return jsonify({
-                "username": current_user.username,
+                "username": user.username,
                 "is_admin": False,
                 "accounts": [],
                 "transactions": [],
                 "message": "No accounts found for this user."
             }), 200
 
-        # Fetch transactions where the user is either the sender or recipient
+        # Fetch one page of transactions where the user is either the sender or recipient
         user_account_ids = [account.id for account in user_accounts]
-        transactions = Transaction.query.filter(
-            (Transaction.account_id.in_(user_account_ids)) |
-            (Transaction.sent_account_id.in_(user_account_ids))
-        ).order_by(Transaction.created_at.desc()).all()
+        transactions, next_cursor = transactions_page(user_account_ids, cursor, limit)
 
         # Build response data
         accounts_data = [
@@ -209,72 +270,181 @@ def dashboard():
             for account in user_accounts
         ]
 
-        transactions_data = [
-            {
-                "id": transaction.id,
-                "created_at": transaction.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                "transaction_type": transaction.transaction_type.value,
-                "account_id": transaction.account_id,
-                "sent_account_id": transaction.sent_account_id,
-                "amount": transaction.amount,
-                "currency": transaction.currency,
-                "description": transaction.description,
-            }
-            for transaction in transactions
-        ]
+        transactions_data = serialize_transactions(transactions)
 
         return jsonify({
-            "username": current_user.username,
+            "username": user.username,
             "is_admin": False,
             "accounts": accounts_data,
             "transactions": transactions_data,
+            "next_cursor": next_cursor,
         }), 200
 
-    except SQLAlchemyError as e:
-        print("Error:", e)
+    except SQLAlchemyError:
+        logger.exception("Error loading dashboard")
         return jsonify({"error": "An error occurred while loading your dashboard."}), 500
 
 
 # Route for viewing user transactions
-@app.route('/transactions', methods=['GET'])
+@api.route('/transactions', methods=['GET'])
 @login_required
+@replica_reads
+@etag_by_data_version
 def view_transactions():
+    try:
+        cursor, limit = parse_page_args(request.args)
+        # Optional search: from, to, type, min_amount, max_amount, q
+        criteria = parse_filter_args(request.args, db.engine.dialect.name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         # Get the IDs of the user's accounts
-        user_account_ids = [account.id for account in current_user.accounts]
+        user_account_ids = [account_id for (account_id,) in
+                            db.session.query(Account.id).filter_by(user_id=current_user.id)]
 
-        # Fetch transactions where the user is either the sender or recipient
-        transactions = Transaction.query.filter(
-            (Transaction.account_id.in_(user_account_ids)) |
-            (Transaction.sent_account_id.in_(user_account_ids))
-        ).order_by(Transaction.created_at.desc()).all()
+        # Fetch one page of transactions where the user is either the sender or recipient
+        transactions, next_cursor = transactions_page(user_account_ids, cursor, limit, criteria)
 
         # Structure the transactions into JSON format
-        transactions_data = [
-            {
-                "id": transaction.id,
-                "created_at": transaction.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                "transaction_type": transaction.transaction_type.value,
-                "account_id": transaction.account_id,
-                "sent_account_id": transaction.sent_account_id,
-                "amount": transaction.amount,
-                "currency": transaction.currency,
-                "description": transaction.description,
-            }
-            for transaction in transactions
-        ]
+        transactions_data = serialize_transactions(transactions)
 
-        return jsonify({"transactions": transactions_data}), 200
+        return jsonify({"transactions": transactions_data, "next_cursor": next_cursor}), 200
 
-    except Exception as e:
-        print(f"Error fetching transactions: {e}")
+    except Exception:
+        logger.exception("Error fetching transactions")
         return jsonify({"error": "An error occurred while fetching transactions."}), 500
 
+# Route for exporting the full transaction history as NDJSON or CSV
+@api.route('/transactions/export', methods=['GET'])
+@login_required
+@replica_reads
+def export_transactions():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({"error": "Unsupported export format."}), 400
+    try:
+        criteria = parse_filter_args(request.args, db.engine.dialect.name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    user_account_ids = [account_id for (account_id,) in
+                        db.session.query(Account.id).filter_by(user_id=current_user.id)]
+
+    # The generator keeps the request context alive while the rows stream out
+    body = render_export(stream_transactions(user_account_ids, criteria=criteria), export_format)
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={"Content-Disposition": f"attachment; filename=transactions.{export_format}"},
+    )
+
+# Route for per-period totals of one account, read from the rollup tables
+@api.route('/accounts/<int:account_id>/summary', methods=['GET'])
+@login_required
+@replica_reads
+def account_summary_route(account_id):
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "granularity must be 'day' or 'month'."}), 400
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({"error": "Invalid date."}), 400
+
+    owned = db.session.scalar(
+        db.select(Account.id).where(Account.id == account_id, Account.user_id == current_user.id))
+    if owned is None:
+        return jsonify({"error": "Account not found."}), 404
+
+    return jsonify({
+        "account_id": account_id,
+        "granularity": granularity,
+        "periods": account_summary(db.session, account_id, granularity, start, end),
+    }), 200
+
+# Route for an account balance derived from the ledger, optionally as of a past instant
+@api.route('/accounts/<int:account_id>/balance', methods=['GET'])
+@login_required
+@replica_reads
+def account_balance(account_id):
+    try:
+        as_of = datetime.fromisoformat(request.args['as_of']) if request.args.get('as_of') else None
+    except ValueError:
+        return jsonify({"error": "Invalid as_of timestamp."}), 400
+
+    currency = db.session.scalar(
+        db.select(Account.currency).where(Account.id == account_id, Account.user_id == current_user.id))
+    if currency is None:
+        return jsonify({"error": "Account not found."}), 404
+
+    minor = balance_minor(db.session, account_id, as_of)
+    return jsonify({
+        "account_id": account_id,
+        "as_of": as_of.isoformat(" ", "seconds") if as_of else None,
+        "balance": from_minor(minor),
+        "balance_minor": minor,
+        "currency": currency,
+    }), 200
+
+# Routes for cash moving in and out of an account (ATM, top-ups)
+
+def cash_movement(account_id, transaction_type):
+    data = request.get_json(silent=True) or {}
+    try:
+        amount = float(data.get('amount'))
+    except (TypeError, ValueError):
+        amount = None
+    kind = transaction_type.value
+    try:
+        transaction_id, balance = move_cash(db.session, current_user.id, account_id, transaction_type, amount)
+    except TransferError as e:
+        TRANSFERS.labels(kind, 'rejected').inc()
+        return jsonify({"error": str(e)}), 400
+    except SQLAlchemyError:
+        TRANSFERS.labels(kind, 'failed').inc()
+        logger.exception("Error during %s", kind)
+        return jsonify({"error": f"An error occurred during the {kind}. Please try again."}), 500
+
+    TRANSFERS.labels(kind, 'succeeded').inc()
+    return jsonify({
+        "message": f"{kind.capitalize()} successful!",
+        "transaction_id": transaction_id,
+        "balance": round(balance, 2),
+    }), 200
+
+@api.route('/accounts/<int:account_id>/deposit', methods=['POST'])
+@login_required
+def deposit(account_id):
+    return cash_movement(account_id, TransactionType.DEPOSIT)
+
+@api.route('/accounts/<int:account_id>/withdraw', methods=['POST'])
+@login_required
+def withdraw(account_id):
+    return cash_movement(account_id, TransactionType.WITHDRAW)
+
 # Route for initiating a transfer
 
-@app.route('/transfer', methods=['POST'])
+def replay(stored):
+    return Response(stored.body, status=stored.status_code, mimetype="application/json",
+                    headers={"Idempotent-Replayed": "true"})
+
+@api.route('/transfer', methods=['POST'])
 @login_required
 def transfer():
+    # Retries carrying the same Idempotency-Key get the original response back
+    key = request.headers.get('Idempotency-Key')
+    if key is not None:
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": "Invalid Idempotency-Key."}), 400
+        fingerprint = request_fingerprint(request.get_json(silent=True))
+        stored = idempotency_store.lookup(db.session, current_user.id, key)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                return jsonify({"error": "Idempotency-Key was already used for a different request."}), 422
+            return replay(stored)
+
     try:
         # Parse JSON data from the request
         data = request.get_json()
@@ -282,52 +452,76 @@ def transfer():
         to_account_number = data.get('to_account_number')
         amount = float(data.get('amount'))
 
-        # Fetch the accounts involved in the transaction
-        from_account = Account.query.filter_by(id=from_account_id, user_id=current_user.id).first()
-        to_account = Account.query.filter_by(account_number=to_account_number).first()
+        # Written by the same commit as the transfer, so it exists only if the transfer does
+        if key is not None:
+            stored = idempotency_store.stage(db.session, current_user.id, key, fingerprint, 200,
+                                             dumps({"message": "Transfer successful!"}))
 
-        # Debug statements
-        print(f"From Account Query Result: {from_account}")
-        print(f"To Account Query Result: {to_account}")
+        # Debit, credit and ledger row are written atomically by the transfer engine
+        transfer_funds(db.session, current_user.id, from_account_id, to_account_number, amount)
 
-        if not from_account or not to_account:
-            return jsonify({"error": "Invalid account details."}), 400
+        TRANSFERS.labels('single', 'succeeded').inc()
+        if key is not None:
+            idempotency_store.remember(current_user.id, key, stored)
+        return jsonify({"message": "Transfer successful!"}), 200
+    except (TypeError, ValueError):
+        db.session.rollback()
+        TRANSFERS.labels('single', 'rejected').inc()
+        return jsonify({"error": "Invalid amount entered."}), 400
+    except TransferError as e:
+        db.session.rollback()
+        TRANSFERS.labels('single', 'rejected').inc()
+        return jsonify({"error": str(e)}), 400
+    except IntegrityError:
+        # A concurrent retry with the same key committed first
+        db.session.rollback()
+        stored = key is not None and idempotency_store.lookup(db.session, current_user.id, key)
+        if stored and stored.fingerprint == fingerprint:
+            return replay(stored)
+        TRANSFERS.labels('single', 'failed').inc()
+        logger.exception("Error during transfer")
+        return jsonify({"error": "An error occurred during the transfer. Please try again."}), 500
+    except SQLAlchemyError:
+        db.session.rollback()
+        TRANSFERS.labels('single', 'failed').inc()
+        logger.exception("Error during transfer")
+        return jsonify({"error": "An error occurred during the transfer. Please try again."}), 500
 
-        if from_account.balance < amount:
-            return jsonify({"error": "Insufficient balance."}), 400
 
-        # Perform the transfer
-        from_account.balance -= amount
-        to_account.balance += amount
-        db.session.commit()
-
-        # Log the transaction
-        transaction = Transaction(
-            amount=amount,
-            currency=from_account.currency,
-            account_id=from_account.id,
-            transaction_type=TransactionType.TRANSFER,
-            sent_account_id=to_account.id,
-            user_id=current_user.id,
-            description=f'Transfer to {to_account_number}'
-        )
-        db.session.add(transaction)
-        db.session.commit()
+# Route for applying many transfers in one request (bulk payouts)
+@api.route('/transfers/batch', methods=['POST'])
+@login_required
+def transfer_batch_route():
+    data = request.get_json(silent=True) or {}
+    items = data.get('transfers')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "A non-empty list of transfers is required."}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} transfers are allowed per batch."}), 400
 
-        return jsonify({"message": "Transfer successful!"}), 200
-    except ValueError:
-        return jsonify({"error": "Invalid amount entered."}), 400
-    except SQLAlchemyError as e:
+    try:
+        results = transfer_batch(db.session, current_user.id, items)
+    except SQLAlchemyError:
         db.session.rollback()
-        print("Error:", e)  # Debugging line
+        TRANSFERS.labels('batch', 'failed').inc(len(items))
+        logger.exception("Error during batch transfer")
         return jsonify({"error": "An error occurred during the transfer. Please try again."}), 500
 
+    succeeded = sum(1 for result in results if result["status"] == "succeeded")
+    TRANSFERS.labels('batch', 'succeeded').inc(succeeded)
+    TRANSFERS.labels('batch', 'rejected').inc(len(results) - succeeded)
+    return jsonify({
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+    }), 200
+
 
 # -------------- Route for Admin-Only  -------------------------------------
 
 # Route for the admin dashboard or landing page
 
-@app.route('/admin', methods=['GET', 'POST'])
+@api.route('/admin', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_portal():
@@ -341,12 +535,27 @@ def admin_portal():
 
 
 # 1. Route for listing all users (admin only)
-@app.route('/admin/users', methods=['GET'])
+@api.route('/admin/users', methods=['GET'])
 @login_required
 @admin_required
+@replica_reads
 def list_users():
+    # Keyset pagination on the primary key plus an optional prefix search
+    after_id = request.args.get('cursor', 0, type=int)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    search = request.args.get('q', '').strip()
+
     try:
-        users = User.query.all()
+        query = User.query.options(selectinload(User.accounts).load_only(Account.account_number))
+        if search:
+            query = query.filter(or_(
+                User.username.startswith(search, autoescape=True),
+                User.email.startswith(search, autoescape=True),
+            ))
+        # Accounts for the whole page are fetched in one extra SELECT ... IN query
+        users = query.filter(User.id > after_id).order_by(User.id).limit(limit + 1).all()
+        next_cursor = str(users[limit - 1].id) if len(users) > limit else None
+
         users_data = [
             {
                 "id": user.id,
@@ -355,15 +564,15 @@ def list_users():
                 "admin": user.admin,
                 "accounts": [account.account_number for account in user.accounts]  # Add account numbers
             }
-            for user in users
+            for user in users[:limit]
         ]
-        return jsonify(users=users_data), 200
-    except SQLAlchemyError as e:
-        print(f"Error fetching users: {e}")  # Debugging statement
+        return jsonify(users=users_data, next_cursor=next_cursor), 200
+    except SQLAlchemyError:
+        logger.exception("Error fetching users")
         return jsonify({"error": "An error occurred while retrieving user data."}), 500
 
 # 2. Route for creating a new user (admin only)
-@app.route('/admin/users/create', methods=['POST'])
+@api.route('/admin/users/create', methods=['POST'])
 @login_required
 @admin_required
 def create_user():
@@ -386,21 +595,22 @@ def create_user():
             return jsonify({"error": "A user with this email already exists."}), 400
 
         # Hash the password and create a new user
-        hashed_password = generate_password_hash(password)
+        hashed_password = password_hasher.hash(password)
         new_user = User(username=username, email=email, password=hashed_password, admin=admin)
         db.session.add(new_user)
         db.session.commit()
 
         return jsonify({"message": "User created successfully."}), 201
-    except SQLAlchemyError as e:
+    except SQLAlchemyError:
         db.session.rollback()
-        print(f"Error creating user: {e}")
+        logger.exception("Error creating user")
         return jsonify({"error": "An error occurred while creating the user."}), 500
 
 # get user info for the edit form(admin only)
-@app.route('/admin/users/<int:user_id>', methods=['GET'])
+@api.route('/admin/users/<int:user_id>', methods=['GET'])
 @login_required
 @admin_required
+@replica_reads
 def get_user(user_id):
     user = User.query.get_or_404(user_id)
     try:
@@ -413,13 +623,13 @@ def get_user(user_id):
                 "admin": user.admin,
             }
         }), 200
-    except SQLAlchemyError as e:
-        print(f"Error fetching user data: {e}")
+    except SQLAlchemyError:
+        logger.exception("Error fetching user data")
         return jsonify({"error": "An error occurred while fetching user data."}), 500
 
 
 # Route for updating a user (admin only)
-@app.route('/admin/users/<int:user_id>/edit', methods=['PUT'])
+@api.route('/admin/users/<int:user_id>/edit', methods=['PUT'])
 @login_required
 @admin_required
 def update_user(user_id):
@@ -441,60 +651,74 @@ def update_user(user_id):
         confirm_password = data.get('confirm_password')
         if password != confirm_password:
             return jsonify({"error": "Passwords do not match."}), 400
-        user.password = generate_password_hash(password)
+        user.password = password_hasher.hash(password)
 
     try:
         # Commit changes to the database
+        bump_data_version(db.session, [user_id])
         db.session.commit()
+        invalidate_user(user_id)
         return jsonify({"message": "User updated successfully."}), 200
-    except SQLAlchemyError as e:
+    except SQLAlchemyError:
         # Rollback and return error on failure
         db.session.rollback()
-        print(f"Error updating user: {e}")
+        logger.exception("Error updating user")
         return jsonify({"error": "An error occurred while updating the user."}), 500
     
 
 # Route for deleting a user (admin only)
-@app.route('/admin/users/<int:user_id>/delete', methods=['POST'])
+@api.route('/admin/users/<int:user_id>/delete', methods=['POST'])
 @login_required
 @admin_required
 def delete_user(user_id):
     try:
         # Attempt to find the user
         user = User.query.get_or_404(user_id)
-        print(f"Attempting to delete user: {user.username}")
 
         # Delete the user
         db.session.delete(user)
         db.session.commit()
-        print("User deleted successfully.")
+        invalidate_user(user_id)
+        logger.info("User deleted", extra={"user_id": user_id})
         return jsonify({"message": "User deleted successfully."}), 200
-    except SQLAlchemyError as e:
-        print(f"Error deleting user: {e}")  # Print the error to the console
+    except SQLAlchemyError:
+        logger.exception("Error deleting user")
         db.session.rollback()
         return jsonify({"error": "An error occurred while deleting the user."}), 500
-    except Exception as e:
-        print(f"Unexpected error: {e}")
+    except Exception:
+        logger.exception("Unexpected error deleting user")
         return jsonify({"error": "Unexpected error occurred. Please try again."}), 500
 
 
 
+# Hit/miss counters of this worker's authenticated-user cache (admin only)
+@api.route('/admin/user-cache', methods=['GET'])
+@login_required
+@admin_required
+def user_cache_stats():
+    return jsonify(user_cache.stats()), 200
+
+
 # -------------- Helps me with errors -----------------------------------------
 
 # Error handlers
-@app.errorhandler(403)
+@api.app_errorhandler(HashingBusy)
+def hashing_busy(e):
+    return jsonify({"error": "The server is busy. Please try again shortly."}), 503, {"Retry-After": "1"}
+
+@api.app_errorhandler(403)
 def forbidden(e):
     if request.is_json:  # Check if the client expects a JSON response
         return jsonify({"error": "Forbidden: You do not have permission to access this resource."}), 403
     return render_template('403.html'), 403
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(e):
     if request.is_json:
         return jsonify({"error": "Not Found: The requested resource could not be found."}), 404
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def server_error(e):
     if request.is_json:
         return jsonify({"error": "Server Error: An internal server error occurred."}), 500
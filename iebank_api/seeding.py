@@ -0,0 +1,205 @@
+import csv
+import enum
+import io
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+
+from iebank_api.account_numbers import account_number_allocator
+from iebank_api.ledger import MINOR_UNITS
+from iebank_api.models import Account, LedgerPosting, Transaction, TransactionType, User
+
+# -------------- SYNTHETIC DATA SEEDING --------------------------------------------
+#
+# Rows are generated as plain tuples, a batch at a time, and written with
+# PostgreSQL COPY from an in-memory CSV buffer or, on other databases, with a
+# Core executemany INSERT. Nothing goes through the ORM constructors.
+
+SEED_PASSWORD = 'password123'
+
+USER_COLUMNS = ('id', 'username', 'email', 'password', 'admin', 'status', 'created_at')
+ACCOUNT_COLUMNS = ('id', 'name', 'account_number', 'balance', 'currency', 'country', 'status',
+                   'created_at', 'user_id')
+TRANSACTION_COLUMNS = ('id', 'created_at', 'account_id', 'sent_account_id', 'transaction_type', 'amount',
+                       'currency', 'description', 'user_id')
+POSTING_COLUMNS = ('transaction_id', 'account_id', 'amount_minor', 'created_at')
+
+
+def _next_id(connection, model):
+    return (connection.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def _fix_sequences(connection):
+    # Explicit ids bypass PostgreSQL sequences; move them past the seeded rows
+    if connection.dialect.name == 'postgresql':
+        for table in ('user', 'account', 'transaction'):
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM \"{table}\"))"
+            ))
+
+
+def copy_buffer(rows):
+    """
+    Render `rows` as CSV for `COPY ... FROM STDIN WITH (FORMAT csv)`.
+    None becomes an unquoted empty field (NULL) and enums are written by name,
+    which is how SQLAlchemy stores them.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([value.name if isinstance(value, enum.Enum) else value for value in row])
+    buffer.seek(0)
+    return buffer
+
+
+def _write_rows(connection, model, columns, rows):
+    if not rows:
+        return
+    table = model.__table__
+    if connection.dialect.name == 'postgresql':
+        preparer = connection.dialect.identifier_preparer
+        statement = (
+            f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(name) for name in columns)}) "
+            "FROM STDIN WITH (FORMAT csv)"
+        )
+        # The raw DBAPI cursor shares the connection's open transaction
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(statement, copy_buffer(rows))
+    else:
+        connection.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+def _transfer_batches(rng, account_count, transactions, batch_size, span):
+    """
+    Yield (sources, targets, amounts, offsets) column lists, one batch at a
+    time. Account indices for a whole batch are drawn in a single call.
+    """
+    accounts = range(account_count)
+    shifts = range(1, account_count)
+    for start in range(0, transactions, batch_size):
+        size = min(batch_size, transactions - start)
+        sources = rng.choices(accounts, k=size)
+        # Shifting by 1..n-1 means the target is never the source
+        targets = [(source + shift) % account_count for source, shift in zip(sources, rng.choices(shifts, k=size))]
+        amounts = [round(rng.uniform(1, 100), 2) for _ in range(size)]
+        offsets = [rng.random() * span for _ in range(size)]
+        yield sources, targets, amounts, offsets
+
+
+def seed_database(engine, users, password_hash, accounts_per_user=1, transactions=0,
+                  days=365, batch_size=5000, prefix='user', rng=None):
+    """
+    Bulk-insert synthetic users, accounts and transactions in batches of
+    `batch_size` rows.
+
+    Users are named `<prefix><n>` with email `<prefix><n>@example.com`, all
+    sharing the precomputed `password_hash`. Each account gets an opening
+    DEPOSIT and then random transfers spread over the last `days` days, each
+    with its two ledger postings.
+
+    The transfer stream is generated twice from the same random state: once
+    to compute final balances, so accounts are written with them directly,
+    and once to write the transactions. Returns the rows written per table.
+    """
+    rng = rng or random.Random()
+    now = datetime.utcnow()
+    opened = now - timedelta(days=days)
+    span = days * 86400
+    account_count = users * accounts_per_user
+    if account_count < 2:
+        transactions = 0
+
+    # Pass 1: balances only
+    opening = [round(rng.uniform(1000, 10000), 2) for _ in range(account_count)]
+    balances = list(opening)
+    state = rng.getstate()
+    for sources, targets, amounts, _ in _transfer_batches(rng, account_count, transactions, batch_size, span):
+        for source, target, amount in zip(sources, targets, amounts):
+            balances[source] -= amount
+            balances[target] += amount
+
+    with engine.begin() as connection:
+        first_user = _next_id(connection, User)
+        first_account = _next_id(connection, Account)
+        first_transaction = _next_id(connection, Transaction)
+        numbers = account_number_allocator.reserve(connection, account_count)
+
+        for start in range(0, users, batch_size):
+            _write_rows(connection, User, USER_COLUMNS, [
+                (first_user + n, f"{prefix}{first_user + n}", f"{prefix}{first_user + n}@example.com",
+                 password_hash, False, "Active", now)
+                for n in range(start, min(start + batch_size, users))
+            ])
+
+        for start in range(0, account_count, batch_size):
+            _write_rows(connection, Account, ACCOUNT_COLUMNS, [
+                (first_account + n, f"Account {n % accounts_per_user + 1}", numbers[n],
+                 round(balances[n], 2), "EUR", "Spain", "Active", now, first_user + n // accounts_per_user)
+                for n in range(start, min(start + batch_size, account_count))
+            ])
+
+        # Opening deposits, each posted from outside the bank (account NULL)
+        for start in range(0, account_count, batch_size):
+            accounts = range(start, min(start + batch_size, account_count))
+            _write_rows(connection, Transaction, TRANSACTION_COLUMNS, [
+                (first_transaction + n, opened, first_account + n, None, TransactionType.DEPOSIT, opening[n],
+                 "EUR", "Opening balance", first_user + n // accounts_per_user)
+                for n in accounts
+            ])
+            _write_rows(connection, LedgerPosting, POSTING_COLUMNS, [
+                posting
+                for n in accounts
+                for posting in (
+                    (first_transaction + n, None, -round(opening[n] * MINOR_UNITS), opened),
+                    (first_transaction + n, first_account + n, round(opening[n] * MINOR_UNITS), opened),
+                )
+            ])
+
+        # Pass 2: the same transfer stream, written out
+        rng.setstate(state)
+        next_id = first_transaction + account_count
+        for sources, targets, amounts, offsets in _transfer_batches(
+                rng, account_count, transactions, batch_size, span):
+            created = [opened + timedelta(seconds=offset) for offset in offsets]
+            _write_rows(connection, Transaction, TRANSACTION_COLUMNS, [
+                (next_id + n, created[n], first_account + source, first_account + target,
+                 TransactionType.TRANSFER, amount, "EUR", f"Transfer to {numbers[target]}",
+                 first_user + source // accounts_per_user)
+                for n, (source, target, amount) in enumerate(zip(sources, targets, amounts))
+            ])
+            _write_rows(connection, LedgerPosting, POSTING_COLUMNS, [
+                posting
+                for n, (source, target, amount) in enumerate(zip(sources, targets, amounts))
+                for posting in (
+                    (next_id + n, first_account + source, -round(amount * MINOR_UNITS), created[n]),
+                    (next_id + n, first_account + target, round(amount * MINOR_UNITS), created[n]),
+                )
+            ])
+            next_id += len(sources)
+
+        _fix_sequences(connection)
+
+    return {
+        "users": users,
+        "accounts": account_count,
+        "transactions": account_count + transactions,
+        "postings": 2 * (account_count + transactions),
+    }
+
+
+def seed_admin(engine, username, password_hash):
+    """
+    Insert an admin user unless one with `username` already exists.
+    """
+    with engine.begin() as connection:
+        if connection.scalar(select(User.id).where(User.username == username)) is None:
+            connection.execute(insert(User), [{
+                "username": username,
+                "email": f"{username}@example.com",
+                "password": password_hash,
+                "admin": True,
+                "status": "Active",
+                "created_at": datetime.utcnow(),
+            }])
@@ -0,0 +1,374 @@
+import math
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, literal, select, update
+
+from iebank_api.account_numbers import account_number_allocator
+from iebank_api.fx import UnknownRate, convert, fx_rates
+from iebank_api.ledger import MAX_AMOUNT, OPENING_BALANCE, record_postings
+from iebank_api.models import Account, Transaction, TransactionType, bump_data_version
+from iebank_api.rollups import record_activity
+
+# -------------- TRANSFER ENGINE ------------------------------------------------
+
+
+class TransferError(Exception):
+    """
+    Raised when a transfer is rejected. The message is safe to show to users.
+    """
+
+
+def _valid_amount(amount):
+    # float() accepts "nan" and "inf", which no comparison with zero rejects;
+    # above MAX_AMOUNT the minor units no longer fit a posting
+    return amount is not None and math.isfinite(amount) and 0 < amount <= MAX_AMOUNT
+
+
+def transfer_funds(session, user_id, from_account_id, to_account_number, amount):
+    """
+    Move `amount` from one of the user's accounts to `to_account_number`.
+
+    The debit, the credit, the ledger row and its postings are written in
+    one database transaction. The debit is a conditional
+    `UPDATE ... WHERE balance >= amount` so two concurrent transfers can never
+    overdraw an account, and both rows are updated in ascending id order so
+    concurrent transfers between the same pair of accounts cannot deadlock.
+    Both owners' data versions and both accounts' rollups are updated in the
+    same transaction. A malformed destination number is rejected before any
+    query is sent.
+
+    Between accounts of different currencies, `amount` is in the source
+    currency and the destination is credited the converted amount, at the
+    rate of the in-process FX snapshot; the rate is recorded on the
+    transaction. Returns the new `Transaction`.
+    """
+    if not _valid_amount(amount):
+        raise TransferError("Invalid amount entered.")
+    if not account_number_allocator.accepts(to_account_number):
+        raise TransferError("Invalid account details.")
+
+    from_account = session.execute(
+        select(Account.id, Account.currency)
+        .where(Account.id == from_account_id, Account.user_id == user_id)
+    ).first()
+    to_account = session.execute(
+        select(Account.id, Account.user_id, Account.currency).where(Account.account_number == to_account_number)
+    ).first()
+
+    if not from_account or not to_account:
+        raise TransferError("Invalid account details.")
+    if from_account.id == to_account.id:
+        raise TransferError("Cannot transfer to the same account.")
+    try:
+        rate, credited = fx_rates.convert(amount, from_account.currency, to_account.currency)
+    except UnknownRate as e:
+        raise TransferError(str(e))
+    if credited > MAX_AMOUNT:
+        raise TransferError("Invalid amount entered.")
+
+    try:
+        now = datetime.utcnow()
+        balances = {}
+        for account_id in sorted((from_account.id, to_account.id)):
+            if account_id == from_account.id:
+                debited = session.execute(
+                    update(Account)
+                    .where(Account.id == account_id, Account.balance >= amount)
+                    .values(balance=Account.balance - amount)
+                    .returning(Account.balance)
+                    .execution_options(synchronize_session=False)
+                ).first()
+                if debited is None:
+                    raise TransferError("Insufficient balance.")
+                balances[account_id] = debited.balance
+            else:
+                balances[account_id] = session.execute(
+                    update(Account)
+                    .where(Account.id == account_id)
+                    .values(balance=Account.balance + credited)
+                    .returning(Account.balance)
+                    .execution_options(synchronize_session=False)
+                ).scalar_one()
+
+        transaction = Transaction(
+            amount=amount,
+            currency=from_account.currency,
+            account_id=from_account.id,
+            transaction_type=TransactionType.TRANSFER,
+            sent_account_id=to_account.id,
+            user_id=user_id,
+            description=f'Transfer to {to_account_number}'
+        )
+        transaction.created_at = now
+        transaction.fx_rate = rate
+        transaction.converted_amount = credited
+        session.add(transaction)
+        session.flush()
+        record_postings(session, [
+            (transaction.id, from_account.id, to_account.id, TransactionType.TRANSFER, amount, now, credited)])
+        record_activity(session, {
+            from_account.id: (0.0, amount, 1, balances[from_account.id]),
+            to_account.id: (credited, 0.0, 1, balances[to_account.id]),
+        }, now)
+        bump_data_version(session, (user_id, to_account.user_id))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return transaction
+
+
+def _cash_statements(user_id, account_id, transaction_type, amount, now):
+    """
+    The conditional balance UPDATE and the INSERT of its ledger row. A
+    withdrawal only matches while the balance covers it.
+    """
+    delta = amount if transaction_type == TransactionType.DEPOSIT else -amount
+    conditions = [Account.id == account_id, Account.user_id == user_id]
+    if transaction_type == TransactionType.WITHDRAW:
+        conditions.append(Account.balance >= amount)
+    moved = (
+        update(Account)
+        .where(*conditions)
+        .values(balance=Account.balance + delta)
+        .returning(Account.id, Account.balance, Account.currency)
+    )
+    recorded = {
+        "created_at": now,
+        "account_id": account_id,
+        "transaction_type": transaction_type,
+        "amount": amount,
+        "description": transaction_type.value.capitalize(),
+        "user_id": user_id,
+    }
+    return moved, recorded
+
+
+def _apply_cash(session, user_id, account_id, transaction_type, amount, now):
+    # Returns (transaction id, new balance), or None if the UPDATE matched nothing
+    moved, recorded = _cash_statements(user_id, account_id, transaction_type, amount, now)
+    if session.get_bind().dialect.name == 'postgresql':
+        # One round trip: the UPDATE feeds the INSERT through a data-modifying CTE
+        moved = moved.cte('moved')
+        columns = [*recorded, 'currency']
+        inserted = (
+            insert(Transaction)
+            .from_select(columns, select(
+                *(literal(value, Transaction.__table__.c[name].type) for name, value in recorded.items()),
+                moved.c.currency,
+            ))
+            .returning(Transaction.id)
+            .cte('inserted')
+        )
+        return session.execute(select(inserted.c.id, moved.c.balance).select_from(moved, inserted)).first()
+
+    # Elsewhere (SQLite cannot put DML in a CTE) the INSERT follows on the same connection
+    row = session.execute(moved.execution_options(synchronize_session=False)).first()
+    if row is None:
+        return None
+    transaction_id = session.scalar(
+        insert(Transaction).values(currency=row.currency, **recorded).returning(Transaction.id))
+    return transaction_id, row.balance
+
+
+def move_cash(session, user_id, account_id, transaction_type, amount):
+    """
+    Deposit `amount` into, or withdraw it from, one of the user's accounts.
+
+    The balance change is a single conditional `UPDATE ... RETURNING` that
+    never loads the account; on PostgreSQL the DEPOSIT or WITHDRAW row is
+    inserted by the same statement. Postings, rollups and the owner's data
+    version follow in the same transaction, which is committed.
+    Returns (transaction id, new balance).
+    """
+    if transaction_type not in (TransactionType.DEPOSIT, TransactionType.WITHDRAW):
+        raise ValueError(f"Not a cash movement: {transaction_type}")
+    if not _valid_amount(amount):
+        raise TransferError("Invalid amount entered.")
+
+    try:
+        now = datetime.utcnow()
+        applied = _apply_cash(session, user_id, account_id, transaction_type, amount, now)
+        if applied is None:
+            # Only a failure pays for telling the two cases apart
+            owned = session.scalar(select(Account.id).where(Account.id == account_id, Account.user_id == user_id))
+            raise TransferError("Insufficient balance." if owned else "Invalid account details.")
+        transaction_id, balance = applied
+
+        record_postings(session, [(transaction_id, account_id, None, transaction_type, amount, now)])
+        inflow, outflow = (amount, 0.0) if transaction_type == TransactionType.DEPOSIT else (0.0, amount)
+        record_activity(session, {account_id: (inflow, outflow, 1, balance)}, now)
+        bump_data_version(session, (user_id,))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return transaction_id, balance
+
+
+def record_opening_balance(session, account_id, user_id, amount, currency):
+    """
+    Record the initial balance of a newly created account as a DEPOSIT, with
+    its postings and rollups, so the ledger accounts for every unit of the
+    balance. The caller commits.
+    """
+    if not amount or amount <= 0:
+        return None
+    if not _valid_amount(amount):
+        raise TransferError("Invalid amount entered.")
+    now = datetime.utcnow()
+    transaction = Transaction(
+        amount=amount,
+        currency=currency,
+        account_id=account_id,
+        transaction_type=TransactionType.DEPOSIT,
+        user_id=user_id,
+        description=OPENING_BALANCE
+    )
+    transaction.created_at = now
+    session.add(transaction)
+    session.flush()
+    record_postings(session, [(transaction.id, account_id, None, TransactionType.DEPOSIT, amount, now)])
+    record_activity(session, {account_id: (amount, 0.0, 1, amount)}, now)
+    return transaction
+
+
+MAX_BATCH_SIZE = 5000
+
+
+def _parse_batch_item(item):
+    """
+    Validate one batch entry, returning (from_account_id, to_account_number, amount).
+    """
+    if not isinstance(item, dict):
+        raise TransferError("Invalid transfer entry.")
+    try:
+        from_account_id = int(item.get('from_account_id'))
+        amount = float(item.get('amount'))
+    except (TypeError, ValueError):
+        raise TransferError("Invalid amount or account entered.")
+    to_account_number = str(item.get('to_account_number') or '')
+    if not account_number_allocator.accepts(to_account_number):
+        raise TransferError("Invalid account details.")
+    if not _valid_amount(amount):
+        raise TransferError("Invalid amount entered.")
+    return from_account_id, to_account_number, amount
+
+
+def transfer_batch(session, user_id, items):
+    """
+    Apply a list of transfers for one user in a single database transaction.
+
+    All destination account numbers are resolved with one `IN` query and
+    every involved account is locked once, in id order. Balances are then
+    checked item by item against running totals, so an entry that would
+    overdraw its source fails on its own without affecting the rest. The
+    accepted deltas are applied with one executemany `UPDATE`, the ledger
+    rows and their postings with one bulk `INSERT` each and the rollups with
+    one upsert.
+
+    Returns one result dict per item, in input order.
+    """
+    results = [None] * len(items)
+    parsed = {}
+    for index, item in enumerate(items):
+        try:
+            parsed[index] = _parse_batch_item(item)
+        except TransferError as e:
+            results[index] = {"index": index, "status": "failed", "error": str(e)}
+
+    numbers = {to_number for _, to_number, _ in parsed.values()}
+    destinations = dict(session.execute(
+        select(Account.account_number, Account.id).where(Account.account_number.in_(numbers))
+    ).all()) if numbers else {}
+
+    involved = {from_id for from_id, _, _ in parsed.values()} | set(destinations.values())
+    locked = {
+        row.id: row for row in session.execute(
+            select(Account.id, Account.user_id, Account.balance, Account.currency)
+            .where(Account.id.in_(involved))
+            .order_by(Account.id)
+            .with_for_update()
+        )
+    } if involved else {}
+
+    # One snapshot for the whole batch, so every entry converts at the same rates
+    snapshot = fx_rates.snapshot
+    now = datetime.utcnow()
+    balances = {account_id: row.balance for account_id, row in locked.items()}
+    deltas = {}
+    activity = {}
+    ledger_rows = []
+    for index, (from_id, to_number, amount) in parsed.items():
+        source = locked.get(from_id)
+        to_id = destinations.get(to_number)
+        if source is None or source.user_id != user_id or to_id is None:
+            error = "Invalid account details."
+        elif from_id == to_id:
+            error = "Cannot transfer to the same account."
+        elif balances[from_id] < amount:
+            error = "Insufficient balance."
+        else:
+            try:
+                rate, credited = convert(snapshot, amount, source.currency, locked[to_id].currency)
+                error = None if credited <= MAX_AMOUNT else "Invalid amount entered."
+            except UnknownRate as e:
+                error = str(e)
+
+        if error:
+            results[index] = {"index": index, "status": "failed", "error": error}
+            continue
+
+        balances[from_id] -= amount
+        balances[to_id] += credited
+        deltas[from_id] = deltas.get(from_id, 0.0) - amount
+        deltas[to_id] = deltas.get(to_id, 0.0) + credited
+        for account_id, inflow, outflow in ((from_id, 0.0, amount), (to_id, credited, 0.0)):
+            totals = activity.get(account_id, (0.0, 0.0, 0))
+            activity[account_id] = (totals[0] + inflow, totals[1] + outflow, totals[2] + 1)
+        ledger_rows.append({
+            "created_at": now,
+            "amount": amount,
+            "currency": source.currency,
+            "account_id": from_id,
+            "transaction_type": TransactionType.TRANSFER,
+            "sent_account_id": to_id,
+            "user_id": user_id,
+            "description": f'Transfer to {to_number}',
+            "fx_rate": rate,
+            "converted_amount": credited,
+        })
+        results[index] = {"index": index, "status": "succeeded"}
+
+    if not ledger_rows:
+        session.rollback()
+        return results
+
+    try:
+        session.execute(
+            update(Account.__table__)
+            .where(Account.__table__.c.id == bindparam('account_id'))
+            .values(balance=Account.__table__.c.balance + bindparam('delta')),
+            [{"account_id": account_id, "delta": delta} for account_id, delta in sorted(deltas.items())],
+        )
+        transaction_ids = session.scalars(
+            insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True), ledger_rows).all()
+        record_postings(session, [
+            (transaction_id, row["account_id"], row["sent_account_id"], TransactionType.TRANSFER, row["amount"], now,
+             row["converted_amount"])
+            for transaction_id, row in zip(transaction_ids, ledger_rows)
+        ])
+        # Running balances are exact: every involved row is locked
+        record_activity(session, {
+            account_id: (inflow, outflow, count, balances[account_id])
+            for account_id, (inflow, outflow, count) in activity.items()
+        }, now)
+        bump_data_version(session, {user_id} | {locked[account_id].user_id for account_id in deltas})
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return results
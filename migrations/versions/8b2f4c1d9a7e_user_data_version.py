@@ -0,0 +1,62 @@
+"""user data_version and the history and user search indexes
+
+Revision ID: 8b2f4c1d9a7e
+Revises:
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2f4c1d9a7e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Databases built by `flask init-db` already have whatever create_all knew
+# about when they were created, so every step checks the live schema first
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def _create_index(name, table, columns, **kw):
+    if name not in _indexes(table):
+        op.create_index(name, table, columns, **kw)
+
+
+def upgrade():
+    if 'data_version' not in _columns('user'):
+        op.add_column('user', sa.Column('data_version', sa.Integer(), nullable=False, server_default='1'))
+
+    _create_index('ix_account_user_id', 'account', ['user_id'])
+    _create_index('ix_transaction_account_created', 'transaction', ['account_id', 'created_at', 'id'])
+    _create_index('ix_transaction_sent_account_created', 'transaction', ['sent_account_id', 'created_at', 'id'])
+
+    if op.get_bind().dialect.name == 'postgresql':
+        _create_index('ix_user_username_prefix', 'user', ['username'],
+                      postgresql_ops={'username': 'text_pattern_ops'})
+        _create_index('ix_user_email_prefix', 'user', ['email'],
+                      postgresql_ops={'email': 'text_pattern_ops'})
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        _create_index('ix_transaction_description_trgm', 'transaction', ['description'],
+                      postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_transaction_description_trgm', table_name='transaction')
+        op.drop_index('ix_user_email_prefix', table_name='user')
+        op.drop_index('ix_user_username_prefix', table_name='user')
+    op.drop_index('ix_transaction_sent_account_created', table_name='transaction')
+    op.drop_index('ix_transaction_account_created', table_name='transaction')
+    op.drop_index('ix_account_user_id', table_name='account')
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,30 @@
+"""transaction fx_rate and converted_amount
+
+Revision ID: c41e7d2a5f93
+Revises: 8b2f4c1d9a7e
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7d2a5f93'
+down_revision = '8b2f4c1d9a7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL on every existing row: transfers recorded before conversion kept one currency
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('transaction')}
+    for name in ('fx_rate', 'converted_amount'):
+        if name not in columns:
+            op.add_column('transaction', sa.Column(name, sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('transaction') as batch_op:
+        batch_op.drop_column('converted_amount')
+        batch_op.drop_column('fx_rate')
@@ -1,18 +1,27 @@
 import pytest
-from iebank_api import app, db
+from iebank_api import create_app, db
+from iebank_api.cache import user_cache
+from iebank_api.fx import fx_rates
+from iebank_api.profiling import query_budget as engine_query_budget
 from iebank_api.models import User, Account, Transaction, TransactionType
 from werkzeug.security import generate_password_hash
 
 
-@pytest.fixture(scope="module")
-def test_client():
+@pytest.fixture(scope="session")
+def app():
     """
-    Set up a Flask test client with an in-memory SQLite database.
+    Build the application with an in-memory SQLite database.
     """
-    app.config["TESTING"] = True
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app = create_app("config.TestingConfig")
     app.config["WTF_CSRF_ENABLED"] = False
+    return app
 
+
+@pytest.fixture(scope="module")
+def test_client(app):
+    """
+    Set up a Flask test client with an in-memory SQLite database.
+    """
     with app.test_client() as testing_client:
         with app.app_context():
             db.create_all()
@@ -23,7 +32,7 @@ def test_client():
 
 
 @pytest.fixture(scope="function", autouse=True)
-def clear_database():
+def clear_database(app):
     """
     Clears the database before each test to avoid duplicate entries.
     """
@@ -31,10 +40,12 @@ def clear_database():
         db.session.remove()
         db.drop_all()
         db.create_all()
+        fx_rates.refresh(db.session)
+    user_cache.clear()
 
 
 @pytest.fixture
-def new_user():
+def new_user(app):
     """
     Create and return a new test user in the database.
     """
@@ -46,11 +57,13 @@ def new_user():
         )
         db.session.add(user)
         db.session.commit()
+        db.session.refresh(user)
+        db.session.expunge(user)
         return user
 
 
 @pytest.fixture
-def new_account(new_user):
+def new_account(app, new_user):
     """
     Create and return a new test account linked to the test user.
     """
@@ -64,11 +77,13 @@ def new_account(new_user):
         )
         db.session.add(account)
         db.session.commit()
+        db.session.refresh(account)
+        db.session.expunge(account)
         return account
 
 
 @pytest.fixture
-def new_transaction(new_account):
+def new_transaction(app, new_account):
     """
     Create and return a test transaction associated with the test account.
     """
@@ -83,4 +98,58 @@ def new_transaction(new_account):
         )
         db.session.add(transaction)
         db.session.commit()
+        db.session.refresh(transaction)
+        db.session.expunge(transaction)
         return transaction
+
+
+@pytest.fixture
+def logged_in_client(test_client, new_account):
+    """
+    Log the test user in and return the test client with its session cookie.
+    """
+    response = test_client.post(
+        "/login", json={"username": "test_user", "password": "password123"}
+    )
+    assert response.status_code == 200
+    yield test_client
+    test_client.get("/logout")
+
+
+@pytest.fixture
+def admin_client(app, test_client):
+    """
+    Create an admin user, log it in and return the test client.
+    """
+    with app.app_context():
+        admin = User(
+            username="test_admin",
+            email="test_admin@example.com",
+            password=generate_password_hash("admin123"),
+            admin=True,
+        )
+        db.session.add(admin)
+        db.session.commit()
+
+    response = test_client.post(
+        "/login", json={"username": "test_admin", "password": "admin123"}
+    )
+    assert response.status_code == 200
+    yield test_client
+    test_client.get("/logout")
+
+
+@pytest.fixture
+def query_budget(app):
+    """
+    Return a context manager that fails the test if the block runs more
+    than the given number of SQL statements:
+
+        with query_budget(3):
+            client.get("/admin/users")
+    """
+    def budget(max_queries):
+        with app.app_context():
+            engine = db.engine
+        return engine_query_budget(engine, max_queries)
+    return budget
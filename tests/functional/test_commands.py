@@ -0,0 +1,94 @@
+from sqlalchemy import inspect, text
+
+from config import TestingConfig
+from iebank_api import create_app, db, start_background_tasks
+from iebank_api.fx import fx_rates
+from iebank_api.idempotency import idempotency_store
+from iebank_api.models import Account, User
+
+
+def test_init_db_creates_a_single_admin(app):
+    """
+    `flask init-db` bootstraps one admin and is safe to run repeatedly.
+    """
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["init-db"]).exit_code == 0
+    assert runner.invoke(args=["init-db"]).exit_code == 0
+
+    with app.app_context():
+        assert User.query.filter_by(admin=True).count() == 1
+
+
+def test_init_db_upgrades_an_existing_database(app):
+    """
+    `flask init-db` adds the columns and indexes a database created by an older release is missing.
+    """
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+            connection.execute(text("DROP INDEX ix_transaction_account_created"))
+            connection.execute(text('ALTER TABLE "user" DROP COLUMN data_version'))
+            connection.execute(text('ALTER TABLE "transaction" DROP COLUMN converted_amount'))
+            connection.execute(text("INSERT INTO \"user\" (username, email, password, created_at, admin, status) "
+                                    "VALUES ('old', 'old@example.com', 'x', CURRENT_TIMESTAMP, 0, 'Active')"))
+
+    assert app.test_cli_runner().invoke(args=["init-db"]).exit_code == 0
+
+    with app.app_context():
+        inspector = inspect(db.engine)
+        assert 'data_version' in {column['name'] for column in inspector.get_columns('user')}
+        assert 'converted_amount' in {column['name'] for column in inspector.get_columns('transaction')}
+        assert 'ix_transaction_account_created' in {index['name'] for index in inspector.get_indexes('transaction')}
+        assert User.query.filter_by(username='old').one().data_version == 1
+
+
+def test_seed_reports_rows_per_second(app):
+    """
+    `flask seed` writes the requested volumes and reports its throughput.
+    """
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["seed", "--users", "5", "--accounts-per-user", "2", "--transactions", "30",
+                                 "--random-seed", "1"])
+    assert result.exit_code == 0, result.output
+    assert "Seeded 135 rows" in result.output
+    assert "rows/s" in result.output
+
+    with app.app_context():
+        assert User.query.count() == 5
+
+
+def test_reconcile_exits_nonzero_on_mismatch(app):
+    """
+    `flask reconcile` reports a clean run and fails once a balance drifts.
+    """
+    runner = app.test_cli_runner()
+    runner.invoke(args=["seed", "--users", "3", "--transactions", "10", "--random-seed", "1"])
+    result = runner.invoke(args=["reconcile"])
+    assert result.exit_code == 0, result.output
+    assert "Checked 3 accounts" in result.output
+    assert "0 mismatches" in result.output
+
+    with app.app_context():
+        db.session.get(Account, 1).balance += 5
+        db.session.commit()
+    result = runner.invoke(args=["reconcile"])
+    assert result.exit_code == 1
+    assert "1 mismatches" in result.output
+
+
+def test_background_threads_start_only_in_serving_processes(monkeypatch):
+    """
+    Building the app, as every CLI command does, starts no threads; serving processes start them explicitly.
+    """
+    started = []
+    monkeypatch.setattr(fx_rates, 'start_refresher', lambda app, interval: started.append('fx'))
+    monkeypatch.setattr(idempotency_store, 'start_sweeper', lambda app, interval: started.append('sweeper'))
+
+    class ServingConfig(TestingConfig):
+        FX_REFRESH_INTERVAL = 60
+        IDEMPOTENCY_SWEEP_INTERVAL = 60
+
+    app = create_app(ServingConfig)
+    assert started == []
+    start_background_tasks(app)
+    assert started == ['sweeper', 'fx']
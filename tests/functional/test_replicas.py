@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from config import TestingConfig
+from iebank_api import create_app, db
+from iebank_api.models import Account, User
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """
+    An app with a primary and one replica, two SQLite files holding the same
+    user but different balances, so each response shows which one served it.
+    """
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_REPLICA_URIS = [f"sqlite:///{tmp_path / 'replica.db'}"]
+
+    app = create_app(ReplicaConfig)
+    password = generate_password_hash("password123", ReplicaConfig.PASSWORD_HASH_METHOD)
+    with app.app_context():
+        for engine, balance in ((db.engine, 100.0), (db.engines['replica_0'], 999.0)):
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(insert(User), [{"id": 1, "username": "reader", "email": "reader@example.com",
+                                                   "password": password, "admin": False, "status": "Active"}])
+                connection.execute(insert(Account), [
+                    {"id": 1, "name": "Main", "account_number": "1" * 20, "balance": balance,
+                     "currency": "EUR", "country": "Spain", "status": "Active", "user_id": 1},
+                    {"id": 2, "name": "Savings", "account_number": "2" * 20, "balance": 0.0,
+                     "currency": "EUR", "country": "Spain", "status": "Active", "user_id": 1},
+                ])
+    yield app
+
+    # The shared `db` registered an (empty) metadata for the replica bind; the other apps have no such bind
+    db.metadatas.pop('replica_0', None)
+
+
+def test_reads_use_replica_until_a_write(replica_app):
+    """
+    GET views read from the replica, but right after a transfer the client reads its own write from the primary.
+    """
+    client = replica_app.test_client()
+    assert client.post("/login", json={"username": "reader", "password": "password123"}).status_code == 200
+
+    response = client.get("/dashboard")
+    assert response.headers["X-DB-Route"] == "replica"
+    assert response.json["accounts"][0]["balance"] == 999.0
+
+    response = client.post("/transfer", json={"from_account_id": 1, "to_account_number": "2" * 20, "amount": 10})
+    assert response.status_code == 200
+
+    response = client.get("/dashboard")
+    assert response.headers["X-DB-Route"] == "primary"
+    assert response.json["accounts"][0]["balance"] == 90.0
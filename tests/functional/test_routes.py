@@ -1,5 +1,7 @@
-from iebank_api.models import User
-from iebank_api import app
+import json
+from datetime import datetime
+from iebank_api.models import User, Account, Transaction, TransactionType, bump_data_version
+from iebank_api import db
 
 
 def test_home_route(test_client):
@@ -11,7 +13,7 @@ def test_home_route(test_client):
     assert b"Welcome" in response.data  # Update this based on your index.html content
 
 
-def test_register_route(test_client):
+def test_register_route(app, test_client):
     """
     Test user registration functionality.
     """
@@ -31,4 +33,472 @@ def test_register_route(test_client):
     with app.app_context():
         user = User.query.filter_by(email="new_user@example.com").first()
         assert user is not None
-        assert user.username == "new_user"
\ No newline at end of file
+        assert user.username == "new_user"
+
+    # An opening balance too large for the ledger is refused before anything is written
+    response = test_client.post("/register", json={
+        "username": "rich_user", "email": "rich_user@example.com", "password": "password123",
+        "confirm_password": "password123", "initial_balance": 1e300})
+    assert response.status_code == 400
+    with app.app_context():
+        assert User.query.filter_by(username="rich_user").first() is None
+
+def test_transactions_pagination(app, logged_in_client, new_account):
+    """
+    Walk the transaction history page by page using the returned cursor.
+    """
+    with app.app_context():
+        for i in range(5):
+            db.session.add(Transaction(
+                amount=10.0 + i,
+                currency="USD",
+                account_id=new_account.id,
+                transaction_type=TransactionType.DEPOSIT,
+                user_id=new_account.user_id,
+            ))
+        db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        query = {"limit": 2}
+        if cursor:
+            query["cursor"] = cursor
+        response = logged_in_client.get("/transactions", query_string=query)
+        assert response.status_code == 200
+        seen.extend(t["id"] for t in response.json["transactions"])
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 5
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_transactions_search_filters(app, logged_in_client, new_account):
+    """
+    Date range, type, amount bounds and description text narrow the listing server-side.
+    """
+    with app.app_context():
+        for amount, kind, description, created_at in [
+            (10.0, TransactionType.DEPOSIT, "Salary March", datetime(2024, 3, 1, 9)),
+            (75.5, TransactionType.WITHDRAW, "Groceries 50% off", datetime(2024, 3, 15, 18)),
+            (120.0, TransactionType.DEPOSIT, "Salary April", datetime(2024, 4, 1, 9)),
+        ]:
+            transaction = Transaction(amount=amount, currency="USD", account_id=new_account.id,
+                                      transaction_type=kind, user_id=new_account.user_id, description=description)
+            transaction.created_at = created_at
+            db.session.add(transaction)
+        db.session.commit()
+
+    def search(**query):
+        response = logged_in_client.get("/transactions", query_string=query)
+        assert response.status_code == 200
+        return [t["description"] for t in response.json["transactions"]]
+
+    assert search(q="salary") == ["Salary April", "Salary March"]
+    assert search(q="50%") == ["Groceries 50% off"]
+    assert search(q="IL") == ["Salary April"]
+    assert search(type="deposit", min_amount="100") == ["Salary April"]
+    assert search(**{"from": "2024-03-01", "to": "2024-03-31"}) == ["Groceries 50% off", "Salary March"]
+    assert search(max_amount="50", q="salary") == ["Salary March"]
+    assert logged_in_client.get("/transactions", query_string={"type": "bogus"}).status_code == 400
+    assert logged_in_client.get("/transactions", query_string={"from": "yesterday"}).status_code == 400
+
+
+def test_transactions_invalid_cursor(logged_in_client):
+    """
+    A cursor we did not issue is rejected.
+    """
+    response = logged_in_client.get("/transactions?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+def test_transactions_export(logged_in_client, new_transaction):
+    """
+    The export streams every transaction as NDJSON or CSV.
+    """
+    response = logged_in_client.get("/transactions/export?format=ndjson")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["description"] == "Test deposit transaction"
+
+    response = logged_in_client.get("/transactions/export?format=csv")
+    assert response.status_code == 200
+    rows = response.get_data(as_text=True).splitlines()
+    assert rows[0].startswith("id,created_at,transaction_type")
+    assert len(rows) == 2
+
+    response = logged_in_client.get("/transactions/export?format=xml")
+    assert response.status_code == 400
+
+
+def test_transfer_route(app, logged_in_client, new_account):
+    """
+    A transfer moves money and writes its ledger row; overdrafts are rejected.
+    """
+    with app.app_context():
+        other = Account(name="Other", currency="USD", country="USA", user_id=new_account.user_id, balance=0.0)
+        db.session.add(other)
+        db.session.commit()
+        other_id, other_number = other.id, other.account_number
+
+    response = logged_in_client.post("/transfer", json={
+        "from_account_id": new_account.id, "to_account_number": other_number, "amount": 200})
+    assert response.status_code == 200
+
+    response = logged_in_client.post("/transfer", json={
+        "from_account_id": new_account.id, "to_account_number": other_number, "amount": 1000})
+    assert response.status_code == 400
+    assert response.json["error"] == "Insufficient balance."
+
+    for amount in ("nan", "inf", 1e300):
+        response = logged_in_client.post("/transfer", json={
+            "from_account_id": new_account.id, "to_account_number": other_number, "amount": amount})
+        assert response.status_code == 400
+    response = logged_in_client.post("/create_account", json={
+        "account_name": "Broken", "currency": "USD", "country": "USA", "initial_balance": "inf"})
+    assert response.status_code == 400
+    response = logged_in_client.post("/create_account", json={
+        "account_name": "Huge", "currency": "USD", "country": "USA", "initial_balance": 1e20})
+    assert response.status_code == 400
+    response = logged_in_client.post("/create_account", json={
+        "account_name": "Euro", "currency": "EURO", "country": "Spain", "initial_balance": 10})
+    assert response.status_code == 400
+
+    with app.app_context():
+        assert db.session.get(Account, new_account.id).balance == 300.0
+        assert db.session.get(Account, other_id).balance == 200.0
+        assert Transaction.query.filter_by(sent_account_id=other_id).count() == 1
+
+    response = logged_in_client.post("/create_account", json={
+        "account_name": "Dollars", "currency": "usd", "country": "USA", "initial_balance": 10})
+    assert response.status_code == 201
+    with app.app_context():
+        dollars = Account.query.filter_by(name="Dollars").one()
+        assert dollars.currency == "USD"
+        dollars_id = dollars.id
+    # Same currency as the USD source once normalised: no exchange rate needed
+    response = logged_in_client.post("/transfer", json={
+        "from_account_id": dollars_id, "to_account_number": new_account.account_number, "amount": 5})
+    assert response.status_code == 200
+
+
+def test_transfer_batch_route(app, logged_in_client, new_account):
+    """
+    Each batch entry succeeds or fails on its own; accepted ones commit together.
+    """
+    with app.app_context():
+        other = Account(name="Other", currency="USD", country="USA", user_id=new_account.user_id, balance=0.0)
+        db.session.add(other)
+        db.session.commit()
+        other_id, other_number = other.id, other.account_number
+
+    response = logged_in_client.post("/transfers/batch", json={"transfers": [
+        {"from_account_id": new_account.id, "to_account_number": other_number, "amount": 300},
+        {"from_account_id": new_account.id, "to_account_number": other_number, "amount": 300},
+        {"from_account_id": new_account.id, "to_account_number": "0" * 20, "amount": 10},
+        {"from_account_id": new_account.id, "to_account_number": other_number, "amount": 150},
+        {"from_account_id": new_account.id, "to_account_number": other_number, "amount": "nan"},
+        {"from_account_id": new_account.id, "to_account_number": other_number, "amount": 1e20},
+    ]})
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json["results"]] == \
+        ["succeeded", "failed", "failed", "succeeded", "failed", "failed"]
+    assert response.json["results"][1]["error"] == "Insufficient balance."
+
+    with app.app_context():
+        assert db.session.get(Account, new_account.id).balance == 50.0
+        assert db.session.get(Account, other_id).balance == 450.0
+        assert Transaction.query.filter_by(sent_account_id=other_id).count() == 2
+
+
+def test_admin_list_users_pagination_and_search(app, admin_client):
+    """
+    The admin listing pages through users and filters them by prefix.
+    """
+    with app.app_context():
+        for i in range(5):
+            user = User(username=f"payroll_{i}", email=f"payroll_{i}@example.com", password="x")
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Account(name="Main", currency="EUR", country="Spain", user_id=user.id))
+        db.session.commit()
+
+    response = admin_client.get("/admin/users?q=payroll_&limit=3")
+    assert response.status_code == 200
+    first_page = response.json["users"]
+    assert len(first_page) == 3
+    assert all(len(user["accounts"]) == 1 for user in first_page)
+
+    response = admin_client.get(f"/admin/users?q=payroll_&limit=3&cursor={response.json['next_cursor']}")
+    assert [user["username"] for user in response.json["users"]] == ["payroll_3", "payroll_4"]
+    assert response.json["next_cursor"] is None
+
+
+def test_user_cache_serves_repeat_requests(admin_client):
+    """
+    The logged-in user is loaded once and then served from the cache.
+    """
+    admin_client.get("/admin")
+    admin_client.get("/admin")
+    stats = admin_client.get("/admin/user-cache").json
+    assert stats["misses"] == 1
+    assert stats["hits"] >= 2
+
+
+def test_login_rehashes_outdated_password(app, test_client, new_user):
+    """
+    Logging in upgrades a hash made with another method to the configured one.
+    """
+    response = test_client.post("/login", json={"username": "test_user", "password": "password123"})
+    assert response.status_code == 200
+    test_client.get("/logout")
+
+    with app.app_context():
+        stored = db.session.get(User, new_user.id).password
+    assert stored.startswith(app.config["PASSWORD_HASH_METHOD"] + "$")
+
+
+def test_admin_list_users_query_budget(app, admin_client, query_budget):
+    """
+    Listing users costs a fixed number of queries however many users exist.
+    """
+    with app.app_context():
+        for i in range(20):
+            user = User(username=f"budget_{i}", email=f"budget_{i}@example.com", password="x")
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Account(name="Main", currency="EUR", country="Spain", user_id=user.id))
+        db.session.commit()
+
+    with query_budget(3):
+        response = admin_client.get("/admin/users")
+    assert response.status_code == 200
+    assert len(response.json["users"]) == 21
+
+
+def test_server_timing_header(logged_in_client, new_transaction):
+    """
+    Every response reports the database time spent on it.
+    """
+    response = logged_in_client.get("/dashboard")
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+
+def test_metrics_endpoint(logged_in_client, new_transaction):
+    """
+    /metrics exposes request latency, status counts and transfer outcomes.
+    """
+    logged_in_client.get("/dashboard")
+    logged_in_client.post("/transfer", json={
+        "from_account_id": new_transaction.account_id, "to_account_number": "0" * 20, "amount": 1})
+
+    response = logged_in_client.get("/metrics")
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'iebank_http_request_duration_seconds_bucket{endpoint="api.dashboard"' in body
+    assert 'iebank_http_requests_total{endpoint="api.dashboard",method="GET",status="200"}' in body
+    assert 'iebank_transfers_total{kind="single",outcome="rejected"}' in body
+    assert "iebank_db_pool_checked_out" in body
+
+
+def test_dashboard_etag_until_data_changes(app, logged_in_client, new_account):
+    """
+    A matching If-None-Match gets a 304 until a transfer bumps the user's data version.
+    """
+    response = logged_in_client.get("/dashboard")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = logged_in_client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    with app.app_context():
+        other = Account(name="Other", currency="USD", country="USA", user_id=new_account.user_id, balance=0.0)
+        db.session.add(other)
+        db.session.commit()
+        other_number = other.account_number
+
+    logged_in_client.post("/transfer", json={
+        "from_account_id": new_account.id, "to_account_number": other_number, "amount": 10})
+
+    response = logged_in_client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert logged_in_client.get("/transactions", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_dashboard_renders_the_name_its_etag_covers(app, logged_in_client, new_account):
+    """
+    A rename made by another worker shows up under the new ETag, despite this process's cached identity.
+    """
+    etag = logged_in_client.get("/dashboard").headers["ETag"]
+
+    # As another worker would: the row changes, this process's user cache is left alone
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == new_account.user_id).values(username="alice"))
+        bump_data_version(db.session, [new_account.user_id])
+        db.session.commit()
+
+    response = logged_in_client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json["username"] == "alice"
+    assert logged_in_client.get("/dashboard", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+def test_transfer_idempotency_key_replays(app, logged_in_client, new_account):
+    """
+    A retried transfer with the same Idempotency-Key is applied once and replayed.
+    """
+    with app.app_context():
+        other = Account(name="Other", currency="USD", country="USA", user_id=new_account.user_id, balance=0.0)
+        db.session.add(other)
+        db.session.commit()
+        other_id, other_number = other.id, other.account_number
+
+    payload = {"from_account_id": new_account.id, "to_account_number": other_number, "amount": 25}
+    headers = {"Idempotency-Key": "retry-1"}
+    first = logged_in_client.post("/transfer", json=payload, headers=headers)
+    retry = logged_in_client.post("/transfer", json=payload, headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json == first.json
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+    response = logged_in_client.post("/transfer", json=dict(payload, amount=30), headers=headers)
+    assert response.status_code == 422
+
+    with app.app_context():
+        assert db.session.get(Account, other_id).balance == 25.0
+        assert Transaction.query.filter_by(sent_account_id=other_id).count() == 1
+
+
+def test_account_summary_reads_rollups(app, logged_in_client, new_account):
+    """
+    Transfers update the day and month totals returned by /accounts/<id>/summary.
+    """
+    with app.app_context():
+        other = Account(name="Other", currency="USD", country="USA", user_id=new_account.user_id, balance=0.0)
+        db.session.add(other)
+        db.session.commit()
+        other_id, other_number = other.id, other.account_number
+
+    for amount in (100, 50):
+        logged_in_client.post("/transfer", json={
+            "from_account_id": new_account.id, "to_account_number": other_number, "amount": amount})
+
+    response = logged_in_client.get(f"/accounts/{new_account.id}/summary", query_string={"granularity": "day"})
+    assert response.status_code == 200
+    [period] = response.json["periods"]
+    assert (period["inflow"], period["outflow"], period["count"], period["closing_balance"]) == (0, 150, 2, 350)
+
+    [period] = logged_in_client.get(f"/accounts/{other_id}/summary").json["periods"]
+    assert period["period"].endswith("-01")
+    assert (period["inflow"], period["count"], period["closing_balance"]) == (150, 2, 150)
+
+    assert logged_in_client.get("/accounts/999/summary").status_code == 404
+    assert logged_in_client.get(f"/accounts/{other_id}/summary?granularity=year").status_code == 400
+
+
+def test_account_balance_from_ledger(app, logged_in_client, new_account):
+    """
+    /accounts/<id>/balance sums ledger postings, now and as of an earlier time.
+    """
+    with app.app_context():
+        other = Account(name="Other", currency="USD", country="USA", user_id=new_account.user_id, balance=0.0)
+        db.session.add(other)
+        db.session.commit()
+        other_id, other_number = other.id, other.account_number
+
+    before = datetime.utcnow()
+    logged_in_client.post("/transfer", json={
+        "from_account_id": new_account.id, "to_account_number": other_number, "amount": 12.34})
+
+    response = logged_in_client.get(f"/accounts/{other_id}/balance")
+    assert response.status_code == 200
+    assert (response.json["balance"], response.json["balance_minor"]) == (12.34, 1234)
+
+    response = logged_in_client.get(f"/accounts/{other_id}/balance", query_string={"as_of": before.isoformat()})
+    assert response.json["balance_minor"] == 0
+
+    assert logged_in_client.get(f"/accounts/{other_id}/balance?as_of=yesterday").status_code == 400
+    assert logged_in_client.get("/accounts/999/balance").status_code == 404
+
+
+def test_transfer_rejects_bad_check_digit_without_queries(app, logged_in_client, new_account, query_budget):
+    """
+    A destination number with a wrong check digit is refused before the database is asked.
+    """
+    logged_in_client.get("/dashboard")
+    with query_budget(0):
+        response = logged_in_client.post("/transfer", json={
+            "from_account_id": new_account.id, "to_account_number": "12345678901234567891", "amount": 1})
+    assert response.status_code == 400
+    assert response.json["error"] == "Invalid account details."
+
+
+def test_deposit_and_withdraw(app, logged_in_client, new_account):
+    """
+    Deposits and withdrawals update the balance, the history and the ledger; overdrafts are refused.
+    """
+    response = logged_in_client.post(f"/accounts/{new_account.id}/deposit", json={"amount": 25.5})
+    assert response.status_code == 200
+    assert response.json["balance"] == 525.5
+
+    response = logged_in_client.post(f"/accounts/{new_account.id}/withdraw", json={"amount": 100})
+    assert response.status_code == 200
+    assert response.json["balance"] == 425.5
+    withdrawal_id = response.json["transaction_id"]
+
+    response = logged_in_client.post(f"/accounts/{new_account.id}/withdraw", json={"amount": 1000})
+    assert response.status_code == 400
+    assert response.json["error"] == "Insufficient balance."
+    for amount in (-5, "nan", "inf", 1e20):
+        assert logged_in_client.post(f"/accounts/{new_account.id}/deposit", json={"amount": amount}).status_code == 400
+    assert logged_in_client.post("/accounts/999/deposit", json={"amount": 5}).json["error"] == \
+        "Invalid account details."
+
+    with app.app_context():
+        assert db.session.get(Account, new_account.id).balance == 425.5
+        withdrawal = db.session.get(Transaction, withdrawal_id)
+        assert (withdrawal.transaction_type, withdrawal.amount, withdrawal.currency) == \
+            (TransactionType.WITHDRAW, 100, new_account.currency)
+        assert Transaction.query.filter_by(account_id=new_account.id).count() == 2
+
+    [period] = logged_in_client.get(f"/accounts/{new_account.id}/summary").json["periods"]
+    assert (period["inflow"], period["outflow"], period["closing_balance"]) == (25.5, 100, 425.5)
+    # The fixture's 500 was written straight to the balance, so the ledger only holds the two movements
+    assert logged_in_client.get(f"/accounts/{new_account.id}/balance").json["balance_minor"] == -7450
+
+
+def test_cross_currency_transfer_converts_and_records_rate(app, logged_in_client, new_account, tmp_path):
+    """
+    Transfers between currencies credit the converted amount at the loaded rate, or fail without one.
+    """
+    with app.app_context():
+        other = Account(name="Euro", currency="EUR", country="Spain", user_id=new_account.user_id, balance=0.0)
+        db.session.add(other)
+        db.session.commit()
+        other_id, other_number = other.id, other.account_number
+
+    payload = {"from_account_id": new_account.id, "to_account_number": other_number, "amount": 100}
+    response = logged_in_client.post("/transfer", json=payload)
+    assert response.status_code == 400
+    assert response.json["error"] == "No exchange rate from USD to EUR."
+
+    rates = tmp_path / "rates.json"
+    rates.write_text('{"EUR": {"USD": 1.25}}')
+    result = app.test_cli_runner().invoke(args=["fx", "load", str(rates)])
+    assert "Loaded 1 exchange rates." in result.output
+
+    assert logged_in_client.post("/transfer", json=payload).status_code == 200
+    with app.app_context():
+        assert db.session.get(Account, new_account.id).balance == 400
+        assert db.session.get(Account, other_id).balance == 80
+        transfer = Transaction.query.filter_by(sent_account_id=other_id).one()
+        assert (transfer.amount, transfer.currency, transfer.fx_rate, transfer.converted_amount) == \
+            (100, "USD", 0.8, 80)
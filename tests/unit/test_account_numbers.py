@@ -0,0 +1,46 @@
+from iebank_api import db
+from iebank_api.account_numbers import (
+    AccountNumberAllocator, account_number_allocator, check_digit, format_number, has_valid_check_digit,
+)
+from iebank_api.models import Account, User
+
+
+def test_check_digit_matches_luhn():
+    """
+    Check digits follow the Luhn algorithm and catch single-digit typos.
+    """
+    assert check_digit("7992739871") == "3"
+    number = format_number(123456789)
+    assert has_valid_check_digit(number)
+    assert not has_valid_check_digit(number[:-2] + str((int(number[-2]) + 1) % 10) + number[-1])
+
+
+def test_pre_check_rejects_legacy_numbers_only_when_asked():
+    """
+    Malformed numbers always fail the pre-check; bad check digits fail once legacy numbers are off.
+    """
+    allocator = AccountNumberAllocator(accept_legacy=True)
+    assert not allocator.accepts("1234")
+    assert not allocator.accepts(None)
+    assert allocator.accepts("12345678901234567891")
+    allocator.configure(accept_legacy=False)
+    assert not allocator.accepts("12345678901234567891")
+    assert allocator.accepts(format_number(42))
+
+
+def test_accounts_get_consecutive_checked_numbers(app):
+    """
+    New accounts draw distinct, valid numbers from the shared counter.
+    """
+    with app.app_context():
+        user = User(username="numbers", email="numbers@example.com", password="x")
+        db.session.add(user)
+        db.session.flush()
+        accounts = [Account(name=f"A{n}", currency="EUR", country="Spain", user_id=user.id) for n in range(3)]
+        db.session.add_all(accounts)
+        db.session.flush()
+        reserved = account_number_allocator.reserve(db.session.connection(), 2)
+        db.session.commit()
+
+        numbers = [account.account_number for account in accounts] + reserved
+        assert numbers == [format_number(value) for value in range(1, 6)]
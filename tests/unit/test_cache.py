@@ -0,0 +1,47 @@
+from iebank_api.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_hits_misses_and_expiry():
+    """
+    Entries are served until their TTL runs out and are counted as hits or misses.
+    """
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=30, clock=clock)
+    loads = []
+
+    def loader(key):
+        loads.append(key)
+        return f"user-{key}"
+
+    assert cache.get_or_load(1, loader) == "user-1"
+    assert cache.get_or_load(1, loader) == "user-1"
+    clock.now = 31
+    assert cache.get_or_load(1, loader) == "user-1"
+
+    assert loads == [1, 1]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_is_bounded_and_invalidated():
+    """
+    The least recently used entry is evicted first and invalidation drops an entry.
+    """
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    cache.invalidate("a")
+    assert cache.get("a") is None
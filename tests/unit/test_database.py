@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from iebank_api.database import CachedToken, StaticCredentialProvider, install_token_auth
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingCredential:
+    """
+    Fake credential that issues numbered tokens valid for one hour.
+    """
+
+    def __init__(self, clock, fail=False):
+        self.clock = clock
+        self.calls = 0
+        self.fail = fail
+
+    def get_token(self):
+        if self.fail:
+            raise RuntimeError("token service unavailable")
+        self.calls += 1
+        return f"token-{self.calls}", self.clock() + 3600
+
+
+def test_token_is_cached_and_refreshed_before_expiry():
+    """
+    The token is reused until it enters the refresh margin, then replaced.
+    """
+    clock = FakeClock()
+    credential = CountingCredential(clock)
+    token = CachedToken(credential, refresh_margin=300, clock=clock)
+
+    assert token.get() == "token-1"
+    clock.now += 3000
+    assert token.get() == "token-1"
+    clock.now += 301
+    assert token.get() == "token-2"
+    assert credential.calls == 2
+
+
+def test_refresh_failure_keeps_valid_token():
+    """
+    A failed refresh falls back to the old token until it actually expires.
+    """
+    clock = FakeClock()
+    credential = CountingCredential(clock)
+    token = CachedToken(credential, refresh_margin=300, clock=clock)
+    token.get()
+
+    credential.fail = True
+    clock.now += 3400
+    assert token.get() == "token-1"
+    clock.now += 300
+    with pytest.raises(RuntimeError):
+        token.get()
+
+
+def test_each_new_connection_gets_the_token(tmp_path):
+    """
+    Every new pooled connection is opened with the current token as password.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'token.db'}", pool_size=1, max_overflow=0)
+    install_token_auth(engine, CachedToken(StaticCredentialProvider("local-secret")))
+
+    seen = []
+
+    # SQLite takes no password: record and strip it before the real connect
+    @event.listens_for(engine, "do_connect")
+    def capture(dialect, connection_record, cargs, cparams):
+        seen.append(cparams.pop("password"))
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    engine.dispose()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    assert seen == ["local-secret", "local-secret"]
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from iebank_api.encoding import dumps
+from iebank_api.history import serialize_transactions
+from iebank_api.models import TransactionType
+
+
+def test_serialize_transactions_matches_legacy_format():
+    """
+    Column tuples serialize to the same dicts the ORM path produced.
+    """
+    created_at = datetime(2024, 3, 1, 9, 5, 7, 123456)
+    rows = [(1, created_at, TransactionType.TRANSFER, 2, 3, 10.5, "EUR", "Rent", 1.0, 10.5)]
+    assert serialize_transactions(rows) == [{
+        "id": 1,
+        "created_at": created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        "transaction_type": "transfer",
+        "account_id": 2,
+        "sent_account_id": 3,
+        "amount": 10.5,
+        "currency": "EUR",
+        "description": "Rent",
+        "fx_rate": 1.0,
+        "converted_amount": 10.5,
+    }]
+
+
+def test_dumps_matches_flask_default_output(app):
+    """
+    Keys are sorted and datetimes use Flask's HTTP date format, as with the default provider.
+    """
+    payload = {"b": 1, "a": datetime(2024, 3, 1, 9, 5, 7)}
+    assert dumps(payload) == '{"a":"Fri, 01 Mar 2024 09:05:07 GMT","b":1}'
+    with app.app_context():
+        assert app.json.loads(app.json.dumps(payload)) == {"a": "Fri, 01 Mar 2024 09:05:07 GMT", "b": 1}
@@ -0,0 +1,68 @@
+import pytest
+
+from iebank_api import db
+from iebank_api.fx import FxRates, UnknownRate, normalize_currency, read_rates
+from iebank_api.ledger import postings_for
+from iebank_api.models import TransactionType
+
+
+def test_snapshot_is_swapped_on_refresh(app, tmp_path):
+    """
+    Loaded rates replace the snapshot wholesale; old snapshots stay unchanged.
+    """
+    rates = FxRates()
+    before = rates.snapshot
+    with pytest.raises(UnknownRate):
+        rates.convert(10, "EUR", "USD")
+
+    path = tmp_path / "rates.csv"
+    path.write_text("base,quote,rate\nEUR,USD,1.25\n")
+    with app.app_context():
+        assert rates.load(db.session, read_rates(str(path))) == 1
+
+    assert rates.convert(10, "EUR", "USD") == (1.25, 12.5)
+    assert rates.convert(12.5, "USD", "EUR") == (0.8, 10.0)
+    assert rates.convert(3, "USD", "USD") == (1.0, 3)
+    assert dict(before.rates) == {}
+    with pytest.raises(TypeError):
+        rates.snapshot.rates[("EUR", "GBP")] = 0.85
+
+
+def test_read_rates_validates_entries(tmp_path):
+    """
+    JSON rate files are accepted; non-positive rates are refused.
+    """
+    path = tmp_path / "rates.json"
+    path.write_text('{"EUR": {"USD": 1.1, "GBP": "0.85"}}')
+    assert read_rates(str(path)) == [("EUR", "USD", 1.1), ("EUR", "GBP", 0.85)]
+    path.write_text('{"EUR": {"USD": 0}}')
+    with pytest.raises(ValueError):
+        read_rates(str(path))
+
+
+def test_currency_codes_are_normalised(tmp_path):
+    """
+    Codes are upper-cased on load and compared case insensitively; anything but three letters is refused.
+    """
+    assert normalize_currency(" eur ") == "EUR"
+    for code in ("EURO", "€", "E1R", ""):
+        with pytest.raises(ValueError):
+            normalize_currency(code)
+
+    path = tmp_path / "rates.csv"
+    path.write_text("base,quote,rate\neur,usd,1.25\n")
+    assert read_rates(str(path)) == [("EUR", "USD", 1.25)]
+    path.write_text("base,quote,rate\nEURO,USD,1.25\n")
+    with pytest.raises(ValueError):
+        read_rates(str(path))
+
+    assert FxRates().convert(10, "eur", "EUR") == (1.0, 10)
+
+
+def test_converted_transfer_postings_balance_per_currency():
+    """
+    A converted transfer posts each currency's pair through the outside world.
+    """
+    legs = postings_for(1, 10, 20, TransactionType.TRANSFER, 10, None, converted_amount=12.5)
+    assert [(leg["account_id"], leg["amount_minor"]) for leg in legs] == \
+        [(10, -1000), (None, 1000), (None, -1250), (20, 1250)]
@@ -0,0 +1,38 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from iebank_api.hashing import HashingBusy, PasswordHasher
+
+
+def test_hash_and_verify_in_process_pool():
+    """
+    Hashes produced by the worker pool verify and carry the configured method.
+    """
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1)
+    try:
+        pwhash = hasher.hash("secret")
+        assert pwhash.startswith("pbkdf2:sha256:1000$")
+        assert hasher.verify(pwhash, "secret")
+        assert not hasher.verify(pwhash, "wrong")
+    finally:
+        hasher.shutdown()
+
+
+def test_needs_rehash_when_method_changes():
+    """
+    Hashes made with a different method or cost are flagged for rehashing.
+    """
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000")
+    assert not hasher.needs_rehash(generate_password_hash("x", "pbkdf2:sha256:1000"))
+    assert hasher.needs_rehash(generate_password_hash("x", "pbkdf2:sha256:2000"))
+    assert hasher.needs_rehash(generate_password_hash("x", "scrypt"))
+
+
+def test_full_queue_fails_fast():
+    """
+    No free slot means an immediate HashingBusy instead of queueing.
+    """
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", max_pending=1)
+    hasher._slots.acquire()
+    with pytest.raises(HashingBusy):
+        hasher.hash("secret")
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+from iebank_api import db
+from iebank_api.idempotency import IdempotencyStore, request_fingerprint
+from iebank_api.models import IdempotencyKey
+
+
+def test_request_fingerprint_ignores_key_order():
+    """
+    The same payload serialised with a different key order has the same fingerprint.
+    """
+    assert request_fingerprint({"a": 1, "b": 2}) == request_fingerprint({"b": 2, "a": 1})
+    assert request_fingerprint({"a": 1}) != request_fingerprint({"a": 2})
+
+
+def test_store_falls_back_to_database_and_sweeps_expired_keys(app, new_user):
+    """
+    Lookups survive a cold cache, and the sweeper deletes only expired keys.
+    """
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    store = IdempotencyStore(ttl=60, clock=lambda: now)
+
+    with app.app_context():
+        store.stage(db.session, new_user.id, "fresh", "f" * 64, 200, '{"ok":true}')
+        db.session.add(IdempotencyKey(user_id=new_user.id, key="old", fingerprint="o" * 64, status_code=200,
+                                      response_body="{}", created_at=now - timedelta(hours=2),
+                                      expires_at=now - timedelta(hours=1)))
+        db.session.commit()
+
+        stored = store.lookup(db.session, new_user.id, "fresh")
+        assert stored.status_code == 200 and stored.body == '{"ok":true}'
+        assert store.lookup(db.session, new_user.id, "old") is None
+
+        assert store.sweep(db.session, batch_size=1) == 1
+        assert [row.key for row in IdempotencyKey.query] == ["fresh"]
+
+
+def test_expired_key_can_be_reused_before_the_sweep(app, new_user):
+    """
+    Staging a key whose old row has expired but is not swept yet replaces that row.
+    """
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    store = IdempotencyStore(ttl=60, clock=lambda: now)
+
+    with app.app_context():
+        db.session.add(IdempotencyKey(user_id=new_user.id, key="reused", fingerprint="o" * 64, status_code=200,
+                                      response_body="{}", created_at=now - timedelta(hours=2),
+                                      expires_at=now - timedelta(hours=1)))
+        db.session.commit()
+
+        store.stage(db.session, new_user.id, "reused", "n" * 64, 200, '{"new":true}')
+        db.session.commit()
+        assert store.lookup(db.session, new_user.id, "reused").fingerprint == "n" * 64
+        assert IdempotencyKey.query.count() == 1
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from iebank_api import db
+from iebank_api.ledger import (backfill_opening_balances, backfill_postings, balance_minor, postings_for,
+                               record_postings, take_snapshots, to_minor)
+from iebank_api.models import Account, BalanceSnapshot, Transaction, TransactionType, User
+from iebank_api.reconciliation import reconcile
+
+
+def test_to_minor_rounds_half_to_even():
+    """
+    Amounts convert to integer cents without float drift.
+    """
+    assert to_minor(0.1 + 0.2) == 30
+    assert to_minor("0.125") == 12
+    assert to_minor(19.99) == 1999
+
+
+def test_postings_balance_to_zero():
+    """
+    Each transaction's two postings cancel out; deposits come from outside the bank.
+    """
+    now = datetime.utcnow()
+    debit, credit = postings_for(1, 10, 20, TransactionType.TRANSFER, 5.5, now)
+    assert (debit["account_id"], credit["account_id"]) == (10, 20)
+    assert debit["amount_minor"] + credit["amount_minor"] == 0
+
+    source, target = postings_for(2, 10, None, TransactionType.DEPOSIT, 5.5, now)
+    assert (source["account_id"], target["account_id"], target["amount_minor"]) == (None, 10, 550)
+
+
+def test_balance_reads_snapshot_plus_tail(app):
+    """
+    Balances past a snapshot match balances summed from every posting.
+    """
+    with app.app_context():
+        user = User(username="ledger", email="ledger@example.com", password="x")
+        db.session.add(user)
+        db.session.flush()
+        account = Account(name="Ledger", currency="EUR", country="Spain", user_id=user.id)
+        db.session.add(account)
+        db.session.flush()
+
+        start = datetime.utcnow() - timedelta(hours=2)
+
+        def post(transaction_type, amount, at):
+            transaction = Transaction(amount, "EUR", account.id, transaction_type, user_id=user.id)
+            db.session.add(transaction)
+            db.session.flush()
+            record_postings(db.session, [(transaction.id, account.id, None, transaction_type, amount, at)])
+
+        post(TransactionType.DEPOSIT, 100, start)
+        post(TransactionType.WITHDRAW, 30, start + timedelta(minutes=10))
+        assert take_snapshots(db.session, now=start + timedelta(hours=1), settle_seconds=0) == 1
+        post(TransactionType.DEPOSIT, 5, start + timedelta(hours=1))
+        db.session.commit()
+
+        assert db.session.query(BalanceSnapshot).one().balance_minor == 7000
+        assert balance_minor(db.session, account.id) == 7500
+        assert balance_minor(db.session, account.id, at=start + timedelta(minutes=5)) == 10000
+        assert balance_minor(db.session, account.id, at=start + timedelta(minutes=90)) == 7500
+        # Nothing new since the last snapshot except the one deposit
+        assert take_snapshots(db.session, settle_seconds=0) == 1
+
+
+def test_backfill_opens_balances_no_transaction_explains(app, new_transaction):
+    """
+    An account opened without an opening deposit gets one for the unexplained part of its balance.
+    """
+    with app.app_context():
+        # 500 on the account, of which only the 100 deposit is a transaction
+        assert reconcile(db.engine)[1:] == (1, 1)
+        assert backfill_postings(db.session) == 1
+        version = db.session.get(User, new_transaction.user_id).data_version
+        assert backfill_opening_balances(db.session) == 1
+        db.session.expire_all()
+        assert db.session.get(User, new_transaction.user_id).data_version == version + 1
+
+        opening = Transaction.query.filter_by(description="Opening balance").one()
+        assert (opening.transaction_type, opening.amount) == (TransactionType.DEPOSIT, 400)
+        assert balance_minor(db.session, new_transaction.account_id) == 50000
+        assert reconcile(db.engine)[1:] == (1, 0)
+        assert backfill_opening_balances(db.session) == 0
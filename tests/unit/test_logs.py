@@ -0,0 +1,74 @@
+import io
+import json
+import logging
+
+from iebank_api.logs import JsonFormatter, SamplingFilter, configure_logging, parse_mapping, stop_logging
+
+
+def make_record(name, level, message="hello", **extra):
+    record = logging.LogRecord(name, level, __file__, 1, message, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extra_fields():
+    """
+    Records become one JSON object carrying the `extra=` fields.
+    """
+    line = JsonFormatter().format(make_record("iebank_api.routes", logging.INFO, user_id=7))
+    entry = json.loads(line)
+    assert entry["message"] == "hello"
+    assert entry["logger"] == "iebank_api.routes"
+    assert entry["user_id"] == 7
+
+
+def test_sampling_filter_keeps_warnings():
+    """
+    Sampled loggers drop low-level records but never warnings.
+    """
+    sampler = SamplingFilter({"iebank_api.profiling": 0.0})
+    assert not sampler.filter(make_record("iebank_api.profiling", logging.INFO))
+    assert sampler.filter(make_record("iebank_api.profiling", logging.WARNING))
+    assert sampler.filter(make_record("iebank_api.routes", logging.INFO))
+
+
+def test_records_are_written_by_the_listener(app):
+    """
+    Log calls are queued and written as JSON by the background listener.
+    """
+    stream = io.StringIO()
+    configure_logging(app, stream=stream)
+    try:
+        logging.getLogger("iebank_api.routes").info("queued", extra={"user_id": 1})
+    finally:
+        stop_logging()
+        configure_logging(app)
+
+    entry = json.loads(stream.getvalue().splitlines()[-1])
+    assert entry["message"] == "queued"
+    assert entry["user_id"] == 1
+
+
+def test_exceptions_keep_their_own_field(app):
+    """
+    A logged exception reaches the listener with its traceback apart from the message.
+    """
+    stream = io.StringIO()
+    configure_logging(app, stream=stream)
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logging.getLogger("iebank_api.routes").exception("failed on %s", "/deposit")
+    finally:
+        stop_logging()
+        configure_logging(app)
+
+    entry = json.loads(stream.getvalue().splitlines()[-1])
+    assert entry["message"] == "failed on /deposit"
+    assert entry["exc_info"].startswith("Traceback") and "ZeroDivisionError" in entry["exc_info"]
+
+
+def test_parse_mapping():
+    assert parse_mapping("a=0.5, b.c=1", float) == {"a": 0.5, "b.c": 1.0}
+    assert parse_mapping("") == {}
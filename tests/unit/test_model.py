@@ -1,5 +1,5 @@
 from iebank_api.models import User, Account, Transaction, TransactionType
-from iebank_api import app, db
+from iebank_api import db
 
 from iebank_api.models import User
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -9,7 +9,7 @@ from iebank_api.models import User, Account, Transaction, TransactionType
 from datetime import datetime, timezone
 
 
-def test_unique_username(test_client):
+def test_unique_username(app, test_client):
     """
     Ensure that `username` must be unique.
     """
@@ -25,7 +25,7 @@ def test_unique_username(test_client):
             db.session.commit()
 
 
-def test_unique_email(test_client):
+def test_unique_email(app, test_client):
     """
     Ensure that `email` must be unique.
     """
@@ -41,7 +41,7 @@ def test_unique_email(test_client):
             db.session.commit()
 
 
-def test_password_hashing(test_client):
+def test_password_hashing(app, test_client):
     """
     Ensure that passwords are stored securely as hashes.
     """
@@ -58,7 +58,7 @@ def test_password_hashing(test_client):
         assert check_password_hash(retrieved_user.password, plain_password)  # Password matches
 
 
-def test_default_status(test_client):
+def test_default_status(app, test_client):
     """
     Ensure that the `status` field defaults to "Active".
     """
@@ -0,0 +1,22 @@
+from iebank_api.profiling import QueryStats, statement_shape
+
+
+def test_statement_shape_collapses_in_lists():
+    """
+    The same statement with different IN-list lengths has one shape.
+    """
+    assert statement_shape("SELECT * FROM account WHERE id IN (?, ?, ?)") == \
+        statement_shape("SELECT *  FROM account\n WHERE id IN (?)")
+
+
+def test_repeated_shapes_flag_n_plus_one():
+    """
+    A statement repeated once per row is reported; one-off statements are not.
+    """
+    stats = QueryStats()
+    stats.record("SELECT * FROM user", 0.001)
+    for i in range(6):
+        stats.record("SELECT * FROM account WHERE ? = account.user_id", 0.001)
+
+    assert stats.count == 7
+    assert list(stats.repeated(5).values()) == [6]
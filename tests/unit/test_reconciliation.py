@@ -0,0 +1,60 @@
+import random
+
+from sqlalchemy import create_engine, select, update
+
+from iebank_api import db, reconciliation
+from iebank_api.models import Account, ReconciliationMismatch
+from iebank_api.reconciliation import reconcile
+from iebank_api.seeding import seed_database
+
+
+def test_reconcile_reports_drifted_balances(app):
+    """
+    Seeded balances reconcile cleanly; a tampered balance is reported.
+    """
+    with app.app_context():
+        seed_database(db.engine, 6, "hash", accounts_per_user=2, transactions=100, rng=random.Random(3))
+        assert reconcile(db.engine, chunk_size=5)[1:] == (12, 0)
+
+        db.session.execute(update(Account).where(Account.id == 7).values(balance=Account.balance + 1))
+        db.session.commit()
+        run_id, checked, mismatches = reconcile(db.engine, chunk_size=5)
+        assert (checked, mismatches) == (12, 1)
+        report = db.session.scalars(select(ReconciliationMismatch).filter_by(run_id=run_id)).one()
+        assert report.account_id == 7
+        assert round(report.recorded_balance - report.computed_balance, 2) == 1
+
+
+def test_reconcile_in_worker_processes(tmp_path):
+    """
+    Account ranges are split across worker processes on a file database.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'reconcile.db'}")
+    db.metadata.create_all(engine)
+    seed_database(engine, 10, "hash", transactions=50, rng=random.Random(5))
+    with engine.begin() as connection:
+        connection.execute(update(Account).where(Account.id.in_((2, 9))).values(balance=0))
+
+    run_id, checked, mismatches = reconcile(engine, workers=2, chunk_size=4,
+                                            config={'SQLALCHEMY_ENGINE_OPTIONS': {'pool_recycle': 60}})
+    assert (checked, mismatches) == (10, 2)
+    with engine.connect() as connection:
+        assert sorted(connection.scalars(select(ReconciliationMismatch.account_id))) == [2, 9]
+    engine.dispose()
+
+
+def test_worker_connects_like_the_app(monkeypatch, tmp_path):
+    """
+    A worker's engine gets the configured engine options and token authentication.
+    """
+    installed = []
+    monkeypatch.setattr(reconciliation, '_connection', None)
+    monkeypatch.setattr(reconciliation, 'init_token_auth',
+                        lambda config, engine: installed.append((config['DB_CREDENTIAL_PROVIDER'], engine)))
+
+    reconciliation._init_worker(f"sqlite:///{tmp_path / 'worker.db'}", {
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_recycle': 60}, 'DB_CREDENTIAL_PROVIDER': 'static'})
+    engine = reconciliation._connection.engine
+    assert installed == [('static', engine)]
+    assert engine.pool._recycle == 60
+    reconciliation._connection.close()
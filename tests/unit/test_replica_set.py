@@ -0,0 +1,24 @@
+from iebank_api.replicas import ReplicaSet
+
+
+class FakeReplicaSet(ReplicaSet):
+    def __init__(self, lags, **kwargs):
+        super().__init__(list(lags), **kwargs)
+        self.lags = lags
+
+    def lag(self, engine):
+        if self.lags[engine] is None:
+            raise ConnectionError(engine)
+        return self.lags[engine]
+
+
+def test_replicas_round_robin_and_skip_lagging_or_down():
+    """
+    Replicas are used in turn; lagging or unreachable ones fall through to the next, then to the primary.
+    """
+    replicas = FakeReplicaSet({"a": 0.1, "b": 0.2}, max_lag=5)
+    assert [replicas.choose()[0] for _ in range(4)] == ["a", "b", "a", "b"]
+
+    replicas = FakeReplicaSet({"a": 30.0, "b": None, "c": 1.0}, max_lag=5)
+    assert replicas.choose() == ("c", 1.0)
+    assert FakeReplicaSet({"a": 30.0}, max_lag=5).choose() == (None, None)
@@ -0,0 +1,39 @@
+import random
+
+from sqlalchemy import select
+
+from iebank_api import db
+from iebank_api.models import Account, AccountRollup
+from iebank_api.rollups import rebuild_rollups
+from iebank_api.seeding import seed_database
+from iebank_api.transfers import transfer_batch, transfer_funds
+
+
+def rollup_rows():
+    return sorted(
+        (row.account_id, row.granularity, row.period_start, round(row.inflow, 2), round(row.outflow, 2),
+         row.transaction_count, round(row.closing_balance, 2))
+        for row in db.session.scalars(select(AccountRollup))
+    )
+
+
+def test_incremental_rollups_match_a_rebuild(app):
+    """
+    Rollups maintained by transfers equal the ones recomputed from the ledger.
+    """
+    with app.app_context():
+        seed_database(db.engine, 4, "hash", transactions=40, rng=random.Random(3))
+        assert rebuild_rollups(db.engine, chunk_size=3) > 0
+
+        accounts = db.session.execute(select(Account.id, Account.user_id, Account.account_number)).all()
+        first, second, third = accounts[:3]
+        transfer_funds(db.session, first.user_id, first.id, second.account_number, 12.5)
+        transfer_funds(db.session, second.user_id, second.id, third.account_number, 7.25)
+        transfer_batch(db.session, first.user_id, [
+            {"from_account_id": first.id, "to_account_number": third.account_number, "amount": 3},
+            {"from_account_id": first.id, "to_account_number": second.account_number, "amount": 4},
+        ])
+        incremental = rollup_rows()
+
+        rebuild_rollups(db.engine, chunk_size=2)
+        assert rollup_rows() == incremental
@@ -0,0 +1,37 @@
+from sqlalchemy import func, select
+
+from iebank_api import db
+from iebank_api.ledger import balance_minor, to_minor
+from iebank_api.models import Account, Transaction, TransactionType, User
+from iebank_api.seeding import copy_buffer, seed_database
+
+
+def test_seed_database_balances_match_history(app):
+    """
+    Seeded balances equal each account's opening deposit plus its transfers.
+    """
+    with app.app_context():
+        counts = seed_database(db.engine, 10, "hash", accounts_per_user=2, transactions=200, batch_size=7)
+        assert counts == {"users": 10, "accounts": 20, "transactions": 220, "postings": 440}
+        assert db.session.scalar(select(func.count(User.id))) == 10
+
+        account = db.session.get(Account, 1)
+        inflow = db.session.scalar(
+            select(func.coalesce(func.sum(Transaction.amount), 0)).where(
+                (Transaction.sent_account_id == account.id) |
+                ((Transaction.account_id == account.id) &
+                 (Transaction.transaction_type == TransactionType.DEPOSIT))))
+        outflow = db.session.scalar(
+            select(func.coalesce(func.sum(Transaction.amount), 0)).where(
+                (Transaction.account_id == account.id) &
+                (Transaction.transaction_type == TransactionType.TRANSFER)))
+        assert abs(account.balance - (inflow - outflow)) < 0.01
+        assert balance_minor(db.session, account.id) == to_minor(account.balance)
+
+
+def test_copy_buffer_writes_nulls_and_enum_names():
+    """
+    COPY rows render None as an empty field and enums by name.
+    """
+    buffer = copy_buffer([(1, None, TransactionType.DEPOSIT, 'a,b')])
+    assert buffer.read() == '1,,DEPOSIT,"a,b"\r\n'